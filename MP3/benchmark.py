@@ -0,0 +1,52 @@
+import argparse
+from timeit import default_timer
+
+from mp3 import parse_many
+from library import find_mp3_files
+
+
+def measure(function, *args):
+    start = default_timer()
+    function(*args)
+    return default_timer() - start
+
+
+def run_parse_many(filenames, workers, index_frames):
+    for _ in parse_many(filenames, workers, index_frames):
+        pass
+
+
+def benchmark_parse(paths, workers_counts, index_frames):
+    # потоки выигрывают, когда файлы читаются с медленного носителя
+    # (сетевой диск, холодный кэш); на файлах в кэше ОС время почти
+    # не меняется - разбор заголовков держит GIL
+    filenames = list(find_mp3_files(paths))
+    print('Parsing {} files, frame index: {}'.format(len(filenames),
+                                                     index_frames))
+
+    single = None
+    for workers in workers_counts:
+        seconds = measure(run_parse_many, filenames, workers, index_frames)
+        single = single or seconds
+        print(' {:3} threads: {:8.3f} s  {:8.1f} files/s  x{:.1f}'.format(
+            workers, seconds, len(filenames) / seconds, single / seconds))
+
+
+def try_start_console_mode():
+    info = 'MP3 parsing benchmark'
+    parser = argparse.ArgumentParser(description=info)
+
+    parser.add_argument('paths', type=str, nargs='+',
+                        help='mp3 files or directories with them')
+    parser.add_argument('-w', '--workers', type=int, nargs='+',
+                        default=[1, 2, 4, 8, 16],
+                        help='thread counts to compare')
+    parser.add_argument('-i', '--index', action='store_true',
+                        help='walk every frame even if Xing/VBRI is present')
+
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = try_start_console_mode()
+    benchmark_parse(args.paths, args.workers, args.index)
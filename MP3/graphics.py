@@ -1,12 +1,14 @@
 import os
-from mp3 import Mp3Info
+from mp3 import Mp3Info, SeekTable
+from timeline import get_timeline
+from hex_model import HexModel
 
 from PyQt5.QtMultimedia import QMediaPlayer, QMediaContent
-from PyQt5.QtCore import Qt, QUrl, QSize, QThread
-from PyQt5.QtGui import QIcon, QPalette
+from PyQt5.QtCore import Qt, QUrl, QSize, QThread, pyqtSignal
+from PyQt5.QtGui import QIcon, QPalette, QPainter, QColor
 from PyQt5.QtWidgets import QMessageBox, QMainWindow, QScrollArea, QAction, \
     QLabel, QFileDialog, QVBoxLayout, QHBoxLayout, QWidget, QListWidget, \
-    QPushButton, QSlider, QAbstractItemView, QTableWidget, QTableWidgetItem
+    QPushButton, QSlider, QAbstractItemView, QTableView, QHeaderView
 
 
 class MainWindow(QMainWindow):
@@ -46,10 +48,12 @@ class MainWidget(QWidget):
             file_name is not None else None
         self.track_name = TrackName(self)
         self.player_window = PlayerWindow(self)
+        self.timeline_window = TimelineWindow(self)
         self.mp3_info_window = Mp3InfoWindow(self)
         self.current_file_screen = CurrentFileScreen(self)
         self.hex_table = HexTable(self)
         self.byte_info_screen = ByteInfoScreen(self)
+        self.update_seek_table()
         self.init_ui()
 
     def init_ui(self):
@@ -59,6 +63,7 @@ class MainWidget(QWidget):
         v1_layout = QVBoxLayout()
         v1_layout.addWidget(self.track_name)
         v1_layout.addWidget(self.player_window)
+        v1_layout.addWidget(self.timeline_window)
         v1_layout.addWidget(self.mp3_info_window)
 
         v2_layout = QVBoxLayout()
@@ -92,21 +97,50 @@ class MainWidget(QWidget):
         if not cur_dir == prev_dir:
             self.player_window.set_list_of_all_mp3_files_in_current_dir()
 
-        if self.hex_table.filler is not None and \
-                self.hex_table.filler.isRunning():
-            self.hex_table.filler.terminate()
-
         try:
             self.track_name.update()
             self.mp3_info_window.update()
             self.hex_table.create_table()
+            self.update_seek_table()
         except AttributeError as e:
             self.mp3_info_window.mp3_info_list.addItem(e.args[0])
 
+    def update_seek_table(self):
+        mp3_info = self.get_mp3_info()
+        if mp3_info is not None:
+            self.player_window.set_seek_table(SeekTable(mp3_info.data))
+            self.timeline_window.set_timeline(None)
+            self.index_loader = IndexLoader(self, mp3_info.data)
+            self.index_loader.timeline_ready.connect(
+                self.timeline_window.set_timeline)
+            self.index_loader.finished.connect(self.index_loader.deleteLater)
+            self.index_loader.start(QThread.LowPriority)
+
     def get_mp3_info(self):
         return self.mp3_info_window.mp3_info
 
 
+class IndexLoader(QThread):
+    # Индекс кадров и временная шкала строятся в фоне, и трек открывается
+    # без обхода кадров; перемотка до конца загрузки ждёт её в locate
+    timeline_ready = pyqtSignal(object)
+
+    def __init__(self, main_widget, mp3_data):
+        super().__init__(main_widget)
+        self.main_widget = main_widget
+        self.mp3_data = mp3_data
+
+    def run(self):
+        try:
+            self.mp3_data.frames.load()
+            timeline = get_timeline(self.mp3_data.filename,
+                                    mp3_data=self.mp3_data)
+        except (AttributeError, OSError):
+            return
+        if self.main_widget.current_file == self.mp3_data.filename:
+            self.timeline_ready.emit(timeline)
+
+
 class ByteInfoScreen(QLabel):
     def __init__(self, main_widget):
         super().__init__(main_widget)
@@ -116,51 +150,38 @@ class ByteInfoScreen(QLabel):
         self.setText(text)
 
 
-class TableFiller(QThread):
-    def __init__(self, fill_table):
-        super().__init__()
-        self.fill_table = fill_table
-
-    def run(self):
-        self.fill_table()
-
-
 class HexTable(QScrollArea):
     def __init__(self, main_widget):
         super().__init__(main_widget)
         self.main_widget = main_widget
         self.mp3_info = None
-        self.filler = None
-        self.table = QTableWidget()
+        self.model = HexModel()
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        # постоянные размеры строк и столбцов: таблице не нужно
+        # просматривать все строки модели, чтобы их вычислить
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.table.verticalHeader().setDefaultSectionSize(22)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.table.horizontalHeader().setDefaultSectionSize(30)
+        self.table.clicked.connect(self.write_byte_info)
         self.setWidgetResizable(True)
         self.setWidget(self.table)
 
     def create_table(self):
         self.mp3_info = self.main_widget.get_mp3_info()
-        self.filler = TableFiller(self.fill_table)
-        self.filler.start()
-
-        self.table.cellClicked.connect(self.write_byte_info)
-
-    def fill_table(self):
-        with open(self.mp3_info.filename, 'rb') as file:
-            byte_count = len(file.read())
-            file.seek(0)
-            row_count = byte_count // 16 + 1
+        self.model.set_file(self.mp3_info.filename)
 
-            self.table.setRowCount(row_count)
-            self.table.setColumnCount(16)
-            self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
-            for row in range(row_count):
-                for column in range(16):
-                    item = QTableWidgetItem()
-                    text = file.read(1).hex()
-                    item.setTextAlignment(Qt.AlignCenter)
-                    item.setText(text)
-                    self.table.setItem(row, column, item)
+    def go_to_offset(self, offset):
+        row, column = divmod(offset, HexModel.columns)
+        index = self.model.index(row, column)
+        self.table.setCurrentIndex(index)
+        self.table.scrollTo(index, QAbstractItemView.PositionAtTop)
 
-    def write_byte_info(self, row, column):
-        self.main_widget.byte_info_screen.update('{}, {}'.format(row, column))
+    def write_byte_info(self, index):
+        self.main_widget.byte_info_screen.update('{}, {}'.format(
+            index.row(), index.column()))
 
 
 class TrackName(QLabel):
@@ -176,13 +197,17 @@ class TrackName(QLabel):
 
 
 class PlayerWindow(QWidget):
+    seek_step = 10  # секунд на нажатие перемотки
+
     def __init__(self, main_widget):
         super().__init__(main_widget)
         self.main_widget = main_widget
         self.mp3_files = []
         self.played = False
         self.is_pause = False
+        self.seek_table = None
         self.player = QMediaPlayer()
+        self.position_slider = QSlider(Qt.Horizontal)
         self.layout = QHBoxLayout()
         self.layout.setAlignment(Qt.AlignCenter)
         self.init_ui()
@@ -209,9 +234,16 @@ class PlayerWindow(QWidget):
         next_file.setIconSize(QSize(40, 24))
 
         previous_file.clicked.connect(self.open_previous_file)
+        rewind.clicked.connect(lambda: self.seek_relative(-self.seek_step))
         play.clicked.connect(self.play_or_pause)
+        forward.clicked.connect(lambda: self.seek_relative(self.seek_step))
         next_file.clicked.connect(self.open_next_file)
 
+        self.position_slider.setFixedWidth(200)
+        self.position_slider.sliderMoved.connect(
+            lambda position: self.seek(position / 1000))
+        self.player.positionChanged.connect(self.update_position)
+
         volume_slider = QSlider(Qt.Horizontal)
         volume_slider.setFixedWidth(100)
         volume_slider.setValue(50)
@@ -222,6 +254,7 @@ class PlayerWindow(QWidget):
         self.layout.addWidget(play)
         self.layout.addWidget(forward)
         self.layout.addWidget(next_file)
+        self.layout.addWidget(self.position_slider)
         self.layout.addWidget(volume_slider)
 
         self.setLayout(self.layout)
@@ -229,6 +262,32 @@ class PlayerWindow(QWidget):
     def change_volume(self, volume):
         self.player.setVolume(volume)
 
+    def set_seek_table(self, seek_table):
+        self.seek_table = seek_table
+        self.position_slider.setRange(0, int(seek_table.duration * 1000))
+        self.position_slider.setValue(0)
+
+    def update_position(self, position):
+        if not self.position_slider.isSliderDown():
+            self.position_slider.setValue(position)
+
+    def seek_relative(self, seconds):
+        self.seek(self.player.position() / 1000 + seconds)
+
+    def seek(self, seconds):
+        # время округляется до начала кадра, а смещение этого кадра
+        # берётся из таблицы - без чтения файла с начала
+        if self.seek_table is None:
+            return
+        if not self.played:
+            self.start_play()
+
+        frame_time, offset = self.seek_table.locate(seconds)
+        self.player.setPosition(int(frame_time * 1000))
+        self.main_widget.hex_table.go_to_offset(offset)
+        self.main_widget.byte_info_screen.update(
+            'Frame at {:.3f} s, offset {}'.format(frame_time, offset))
+
     def play_or_pause(self):
         if self.is_pause:
             self.play()
@@ -286,6 +345,50 @@ class PlayerWindow(QWidget):
                           if file[-4:] == '.mp3']
 
 
+class TimelineWindow(QWidget):
+    # Битрейт (столбцы) и громкость по global_gain (линия) по всему
+    # треку; щелчок перематывает на выбранное место
+    def __init__(self, main_widget):
+        super().__init__(main_widget)
+        self.main_widget = main_widget
+        self.timeline = None
+        self.setFixedHeight(60)
+
+    def set_timeline(self, timeline):
+        self.timeline = timeline
+        self.repaint()
+
+    def paintEvent(self, event):
+        if not self.timeline:
+            return
+
+        width, height = self.width(), self.height()
+        count = len(self.timeline)
+        max_bitrate = max(self.timeline.bitrates) or 1
+        min_gain = min(self.timeline.gains)
+        gain_range = max(self.timeline.gains) - min_gain or 1
+
+        painter = QPainter(self)
+        previous_y = None
+        for x in range(width):
+            bucket = x * count // width
+            bar = self.timeline.bitrates[bucket] * height // max_bitrate
+            painter.fillRect(x, height - bar, 1, bar, QColor(90, 140, 200))
+
+            gain = self.timeline.gains[bucket] - min_gain
+            y = height - 1 - gain * (height - 1) // gain_range
+            painter.setPen(QColor(230, 120, 40))
+            painter.drawLine(x - 1, previous_y or y, x, y)
+            previous_y = y
+        painter.end()
+
+    def mousePressEvent(self, event):
+        if self.timeline:
+            duration = len(self.timeline) * self.timeline.bucket_duration
+            self.main_widget.player_window.seek(
+                event.x() / self.width() * duration)
+
+
 class Mp3InfoWindow(QScrollArea):
     def __init__(self, main_window):
         super().__init__(main_window)
@@ -299,7 +402,8 @@ class Mp3InfoWindow(QScrollArea):
 
     def update(self):
         if self.main_window.current_file is not None:
-            self.mp3_info = Mp3Info(self.main_window.current_file)
+            self.mp3_info = Mp3Info(self.main_window.current_file,
+                                    index_frames=False)
             self.mp3_info_list.addItems(str(self.mp3_info).split('\n'))
 
 
@@ -0,0 +1,56 @@
+import os
+from mmap import mmap, ACCESS_READ
+from PyQt5.QtCore import Qt, QAbstractTableModel, QModelIndex
+
+
+class HexModel(QAbstractTableModel):
+    # Байты файла по 16 в строке. Файл отображается в память, а текст
+    # ячеек форматируется только для тех строк, которые видны в таблице.
+    columns = 16
+
+    def __init__(self):
+        super().__init__()
+        self.file = None
+        self.mapping = b''
+
+    def set_file(self, file_name):
+        self.beginResetModel()
+        self.close()
+        self.file = open(file_name, 'rb')
+        if os.fstat(self.file.fileno()).st_size:
+            self.mapping = mmap(self.file.fileno(), 0, access=ACCESS_READ)
+        self.endResetModel()
+
+    def close(self):
+        if self.mapping:
+            self.mapping.close()
+        if self.file is not None:
+            self.file.close()
+        self.file = None
+        self.mapping = b''
+
+    def get_offset(self, index):
+        return index.row() * self.columns + index.column()
+
+    def rowCount(self, parent=QModelIndex()):
+        return (len(self.mapping) + self.columns - 1) // self.columns
+
+    def columnCount(self, parent=QModelIndex()):
+        return self.columns
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role == Qt.TextAlignmentRole:
+            return Qt.AlignCenter
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+        offset = self.get_offset(index)
+        if offset >= len(self.mapping):
+            return None
+        return '{:02x}'.format(self.mapping[offset])
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return '{:x}'.format(section)
+        return '{:08x}'.format(section * self.columns)
@@ -0,0 +1,407 @@
+import os
+import shutil
+import tempfile
+from zlib import decompress, error as zlib_error
+from collections import OrderedDict
+from info import tag_version
+
+text_encodings = {0: 'latin-1', 1: 'utf-16', 2: 'utf-16-be', 3: 'utf-8'}
+
+# Кадры ID3v2.2 с трёхбуквенными именами, у которых тот же формат
+comment_frames = ('COMM', 'USLT', 'COM', 'ULT')
+picture_frames = ('APIC', 'PIC')
+# сколько байт начала кадра с картинкой читается для разбора описания
+PICTURE_PREFIX = 1024
+# тег, который не поместился на старое место, дополняется до кратного
+# этому размеру с запасом не меньше него: следующие правки пойдут на месте
+TAG_PADDING = 4096
+COPY_BLOCK = 1 << 20
+
+
+def int_from_bytes(bytes_line):
+    return int.from_bytes(bytes_line, byteorder='big')
+
+
+def int_from_syncsafe(bytes_line):
+    # по 7 значащих бит в каждом байте
+    number = 0
+    for byte in bytes_line:
+        number = number << 7 | byte & 0x7f
+    return number
+
+
+def syncsafe_from_int(number):
+    return bytes(number >> shift & 0x7f for shift in (21, 14, 7, 0))
+
+
+def remove_unsynchronisation(data):
+    return data.replace(b'\xff\x00', b'\xff')
+
+
+def get_raw_length(raw, length):
+    # сколько байт исходных данных дают length байт после снятия
+    # рассинхронизации
+    position = 0
+    for _ in range(length):
+        position += 2 if raw[position:position + 2] == b'\xff\x00' else 1
+    return position
+
+
+def split_terminated(data, encoding):
+    # строка до нуля (двух нулей для UTF-16) и остаток после него
+    terminator = b'\x00\x00' if encoding in (1, 2) else b'\x00'
+    index = data.find(terminator)
+    while terminator == b'\x00\x00' and index % 2 and index != -1:
+        index = data.find(terminator, index + 1)
+    if index == -1:
+        return data, b''
+    return data[:index], data[index + len(terminator):]
+
+
+def decode_text(data, encoding):
+    try:
+        text = data.decode(text_encodings[encoding])
+    except (KeyError, UnicodeDecodeError):
+        text = data.decode('latin-1')
+    # в ID3v2.4 несколько значений разделяются нулями
+    return '/'.join(value for value in text.split('\x00') if value)
+
+
+class Picture:
+    # Ссылка на картинку внутри файла: данные читаются только в read()
+
+    def __init__(self, file_name, offset, length, mime, picture_type,
+                 description, unsynchronised=False, data=None):
+        self.file_name = file_name
+        self.offset = offset
+        self.length = length
+        self.mime = mime
+        self.picture_type = picture_type
+        self.description = description
+        self.unsynchronised = unsynchronised
+        # данные хранятся, только если ссылка на байты файла невозможна:
+        # сжатый кадр или рассинхронизированный целиком тег v2.3
+        self.data = data
+
+    def read(self):
+        if self.data is not None:
+            return self.data
+        with open(self.file_name, 'rb') as file:
+            file.seek(self.offset)
+            data = file.read(self.length)
+        return remove_unsynchronisation(data) if self.unsynchronised \
+            else data
+
+    def __str__(self):
+        return '{}, {} bytes'.format(self.mime, self.length)
+
+
+class Id3Tag:
+    # Тег ID3v2.2/2.3/2.4 в начале файла. Кадры читаются по одному,
+    # картинки не читаются вовсе: вместо них - ссылки Picture
+    frame_header_sizes = {2: 6, 3: 10, 4: 10}
+
+    def __init__(self, file_name):
+        self.file_name = file_name
+        self.version = None
+        self.flags = 0
+        self.size = 0
+        self.frames = OrderedDict()
+        self.pictures = []
+
+    def read(self, file):
+        # возвращает полный размер тега или 0, если тега нет
+        file.seek(0)
+        header = file.read(10)
+        if len(header) < 10 or header[:3] != b'ID3' or \
+                header[3] not in tag_version.keys():
+            return 0
+
+        self.version = header[3]
+        self.flags = header[5]
+        tag_length = int_from_syncsafe(header[6:10])
+        self.size = 10 + tag_length + self.get_footer_size()
+        self.read_frames(*self.get_frames_source(file, tag_length))
+        return self.size
+
+    def get_footer_size(self):
+        # footer есть только в v2.4, в v2.3 этот флаг не определён
+        return 10 if self.version == 4 and self.flags & 0x10 else 0
+
+    def get_frames_source(self, file, tag_length):
+        # (data, начало, конец, file) для iter_frames
+        file.seek(10)
+        if self.flags & 0x80 and self.version < 4:
+            # до v2.4 рассинхронизирован весь тег, и смещения в файле
+            # не соответствуют данным кадров: тег читается целиком
+            data = remove_unsynchronisation(file.read(tag_length))
+            return data, 0, len(data), None
+        return None, 10, 10 + tag_length, file
+
+    def read_frames(self, data, position, end, file):
+        for frame_id, position, size, flags in self.iter_frames(
+                data, position, end, file):
+            if frame_id in picture_frames:
+                self.read_picture(data, file, frame_id, position, size, flags)
+            else:
+                frame_data = self.read_bytes(data, file, position, size)
+                frame_data = self.unpack_frame(frame_data, flags)
+                if frame_data is not None:
+                    self.set_frame(frame_id, self.decode_frame(frame_id,
+                                                               frame_data))
+
+    def read_raw_frames(self, file):
+        # [(имя, флаги, данные)] кадров в том виде, в каком они лежат
+        # в файле, - для перезаписи тега без разбора содержимого
+        tag_length = self.size - 10 - self.get_footer_size()
+        data, position, end, file = self.get_frames_source(file, tag_length)
+        frames = []
+        for frame_id, position, size, flags in self.iter_frames(
+                data, position, end, file):
+            if self.version == 4 and self.flags & 0x80:
+                flags |= 0x02  # флаг рассинхронизации тега уходит в кадры
+            frames.append((frame_id, flags,
+                           self.read_bytes(data, file, position, size)))
+        return frames
+
+    def iter_frames(self, data, position, end, file):
+        # (имя, начало данных, размер, флаги) каждого кадра;
+        # источник кадров - либо data в памяти, либо сам file
+        position += self.get_extended_header_size(data, position, file)
+        header_size = self.frame_header_sizes[self.version]
+        while position + header_size <= end:
+            header = self.read_bytes(data, file, position, header_size)
+            if len(header) < header_size or header[0] == 0:
+                return  # заполнение после последнего кадра
+
+            frame_id, size, flags = self.parse_frame_header(header)
+            position += header_size
+            if size > end - position:
+                return
+            try:
+                frame_id = frame_id.decode('ascii')
+            except UnicodeDecodeError:
+                return
+
+            yield frame_id, position, size, flags
+            position += size
+
+    def get_extended_header_size(self, data, position, file):
+        if not self.flags & 0x40 or self.version == 2:
+            return 0
+        size = self.read_bytes(data, file, position, 4)
+        if self.version == 3:
+            return 4 + int_from_bytes(size)  # размер без этих 4 байт
+        return int_from_syncsafe(size)
+
+    @staticmethod
+    def read_bytes(data, file, position, size):
+        if data is not None:
+            return data[position:position + size]
+        file.seek(position)
+        return file.read(size)
+
+    def parse_frame_header(self, header):
+        if self.version == 2:
+            return header[:3], int_from_bytes(header[3:6]), 0
+        size = int_from_syncsafe(header[4:8]) if self.version == 4 \
+            else int_from_bytes(header[4:8])
+        return header[:4], size, int_from_bytes(header[8:10])
+
+    def get_frame_flags(self, flags):
+        # (группа, сжатие, шифрование, рассинхронизация, длина данных)
+        if self.version == 3:
+            return flags & 0x20, flags & 0x80, flags & 0x40, False, \
+                flags & 0x80
+        if self.version == 4:
+            return flags & 0x40, flags & 0x08, flags & 0x04, \
+                flags & 0x02 or self.flags & 0x80, flags & 0x01
+        return False, False, False, False, False
+
+    def get_prefix_size(self, flags):
+        grouping, _, _, _, data_length = self.get_frame_flags(flags)
+        return (1 if grouping else 0) + (4 if data_length else 0)
+
+    def unpack_frame(self, frame_data, flags):
+        # None - кадр зашифрован или повреждён
+        _, compressed, encrypted, unsynchronised, _ = \
+            self.get_frame_flags(flags)
+        prefix_size = self.get_prefix_size(flags)
+        if encrypted or len(frame_data) <= prefix_size:
+            return None
+        frame_data = frame_data[prefix_size:]
+        if unsynchronised:
+            frame_data = remove_unsynchronisation(frame_data)
+        if compressed:
+            try:
+                frame_data = decompress(frame_data)
+            except zlib_error:
+                return None
+        return frame_data
+
+    def read_picture(self, data, file, frame_id, position, size, flags):
+        _, compressed, encrypted, unsynchronised, _ = \
+            self.get_frame_flags(flags)
+        prefix_size = self.get_prefix_size(flags)
+        if encrypted or size <= prefix_size:
+            return  # кадр короче собственного префикса повреждён
+
+        if compressed or data is not None:
+            frame_data = self.unpack_frame(
+                self.read_bytes(data, file, position, size), flags)
+            if frame_data is None:
+                return
+            picture = self.parse_picture(frame_id, frame_data)
+            picture.data = frame_data[picture.offset:]
+            picture.offset = None
+            picture.length = len(picture.data)
+        else:
+            raw = self.read_bytes(None, file, position + prefix_size,
+                                  min(size - prefix_size, PICTURE_PREFIX))
+            prefix = remove_unsynchronisation(raw) if unsynchronised \
+                else raw
+            picture = self.parse_picture(frame_id, prefix)
+            if unsynchronised:
+                picture.offset = get_raw_length(raw, picture.offset)
+            picture.offset += position + prefix_size
+            picture.length = position + size - picture.offset
+            picture.unsynchronised = bool(unsynchronised)
+        self.pictures.append(picture)
+
+    def parse_picture(self, frame_id, data):
+        # offset в результате - начало картинки относительно data
+        encoding = data[0] if data else 0
+        if frame_id == 'PIC':
+            mime = 'image/' + data[1:4].decode('latin-1').lower()
+            rest = data[4:]
+        else:
+            mime, rest = split_terminated(data[1:], 0)
+            mime = mime.decode('latin-1')
+        picture_type = rest[0] if rest else 0
+        description, rest = split_terminated(rest[1:], encoding)
+        return Picture(self.file_name, len(data) - len(rest), 0, mime,
+                       picture_type, decode_text(description, encoding))
+
+    @staticmethod
+    def decode_frame(frame_id, data):
+        if not data:
+            return ''
+        encoding = data[0]
+
+        if frame_id in ('TXXX', 'TXX', 'WXXX', 'WXX'):
+            description, value = split_terminated(data[1:], encoding)
+            value = decode_text(value, encoding if frame_id[0] == 'T'
+                                else 0)
+            description = decode_text(description, encoding)
+            return '{}: {}'.format(description, value) if description \
+                else value
+        if frame_id[0] == 'T':
+            return decode_text(data[1:], encoding)
+        if frame_id[0] == 'W':
+            return decode_text(data, 0)
+        if frame_id in comment_frames:
+            description, text = split_terminated(data[4:], encoding)
+            text = decode_text(text, encoding)
+            description = decode_text(description, encoding)
+            return '{}: {}'.format(description, text) if description \
+                else text
+        return data
+
+    def set_frame(self, frame_id, value):
+        if value in ('', b''):
+            return
+        if frame_id not in self.frames.keys():
+            self.frames[frame_id] = value
+        elif type(value) == str:
+            self.frames[frame_id] += '; ' + value
+
+
+def encode_text_frame(version, text):
+    # v2.4 - UTF-8, v2.3 - latin-1 или UTF-16 с BOM
+    if version == 4:
+        return b'\x03' + text.encode('utf-8')
+    try:
+        return b'\x00' + text.encode('latin-1')
+    except UnicodeEncodeError:
+        return b'\x01' + text.encode('utf-16')
+
+
+def pack_frames(version, frames):
+    packed = []
+    for frame_id, flags, data in frames:
+        size = syncsafe_from_int(len(data)) if version == 4 \
+            else len(data).to_bytes(4, byteorder='big')
+        packed.append(frame_id.encode('ascii') + size +
+                      flags.to_bytes(2, byteorder='big') + data)
+    return b''.join(packed)
+
+
+def update_frames(version, frames, changes):
+    # changes: {имя текстового кадра: текст или None - удалить кадр}
+    for frame_id in changes:
+        if len(frame_id) != 4 or frame_id[0] != 'T' or frame_id == 'TXXX':
+            raise AttributeError(
+                'Only ID3v2 text frames can be written: ' + frame_id)
+
+    # кадры с флагом "удалить при изменении тега" не переносятся
+    discard_flag = 0x4000 if version == 4 else 0x8000
+    result = []
+    written = set()
+    for frame_id, flags, data in frames:
+        if frame_id in changes:
+            if frame_id not in written and changes[frame_id]:
+                result.append((frame_id, 0, encode_text_frame(
+                    version, changes[frame_id])))
+            written.add(frame_id)
+        elif not flags & discard_flag:
+            result.append((frame_id, flags, data))
+
+    for frame_id, text in changes.items():
+        if frame_id not in written and text:
+            result.append((frame_id, 0, encode_text_frame(version, text)))
+    return result
+
+
+def write_tag(file_name, changes):
+    # Меняет текстовые кадры ID3v2, остальные кадры (картинки, комментарии,
+    # неизвестные) переносит байт в байт. Если новый тег помещается
+    # в старый вместе с его заполнением, переписывается только тег, иначе
+    # файл собирается заново с запасом TAG_PADDING.
+    # True - тег записан на месте
+    tag = Id3Tag(file_name)
+    with open(file_name, 'rb') as file:
+        old_size = tag.read(file)
+        frames = tag.read_raw_frames(file) if old_size else []
+    if tag.version == 2:
+        raise AttributeError('ID3v2.2 tags can not be written')
+
+    # расширенный заголовок, рассинхронизация и footer не сохраняются
+    version = tag.version or 3
+    body = pack_frames(version, update_frames(version, frames, changes))
+    if old_size and 10 + len(body) <= old_size:
+        with open(file_name, 'r+b') as file:
+            file.write(get_tag_header(version, old_size - 10) + body +
+                       bytes(old_size - 10 - len(body)))
+        return True
+
+    size = 10 + len(body) + TAG_PADDING
+    size += -size % TAG_PADDING
+    descriptor, temp_name = tempfile.mkstemp(
+        suffix='.mp3', dir=os.path.dirname(os.path.abspath(file_name)))
+    try:
+        with os.fdopen(descriptor, 'wb') as temp, \
+                open(file_name, 'rb') as file:
+            temp.write(get_tag_header(version, size - 10) + body +
+                       bytes(size - 10 - len(body)))
+            file.seek(old_size)
+            shutil.copyfileobj(file, temp, COPY_BLOCK)
+        shutil.copymode(file_name, temp_name)
+        os.replace(temp_name, file_name)
+    except OSError:
+        os.remove(temp_name)
+        raise
+    return False
+
+
+def get_tag_header(version, tag_length):
+    return b'ID3' + bytes((version, 0, 0)) + syncsafe_from_int(tag_length)
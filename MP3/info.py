@@ -1,35 +1,50 @@
 speed = {1: 'Slow', 2: 'Medium', 3: 'Fast', 4: 'Hardcore'}
-protection = {'0': 'Not protected', '1': 'Protected by CRC'}
-copyright = {'0': 'Audio is not copyrighted', '1': 'Audio is copyrighted'}
-original = {'0': 'Copy of original media', '1': 'Original media'}
-emphasis = {'00': 'None', '01': '50/15ms', '11': 'CCIT J.17'}
 tag_version = {2: 'ID3v2.2', 3: 'ID3v2.3', 4: 'ID3v2.4'}
-mpeg_version = {'00': 'MPEG-2.5', '10': 'MPEG-2', '11': 'MPEG-1'}
-layer_version = {'01': 'Layer 3', '10': 'Layer 2', '11': 'Layer 1'}
-channel_mode = {'00': 'Stereo', '01': 'Joint stereo (Stereo)',
-                '10': 'Dual channel', '11': 'Mono'}
 
-xing_header_offset = {'MPEG-1': {'Stereo': 32, 'Joint stereo': 32,
+# Поля заголовка кадра, ключи - значения битов
+protection = {0: 'Not protected', 1: 'Protected by CRC'}
+copyright = {0: 'Audio is not copyrighted', 1: 'Audio is copyrighted'}
+original = {0: 'Copy of original media', 1: 'Original media'}
+emphasis = {0: 'None', 1: '50/15ms', 3: 'CCIT J.17'}
+mpeg_version = {0: 'MPEG-2.5', 2: 'MPEG-2', 3: 'MPEG-1'}
+layer_version = {1: 'Layer 3', 2: 'Layer 2', 3: 'Layer 1'}
+channel_mode = {0: 'Stereo', 1: 'Joint stereo (Stereo)',
+                2: 'Dual channel', 3: 'Mono'}
+
+# размер side info: заголовок Xing/Info начинается сразу за ним
+xing_header_offset = {'MPEG-1': {'Stereo': 32, 'Joint stereo (Stereo)': 32,
                                  'Dual channel': 32, 'Mono': 17},
-                      'MPEG-2': {'Stereo': 17, 'Joint stereo': 17,
+                      'MPEG-2': {'Stereo': 17, 'Joint stereo (Stereo)': 17,
                                  'Dual channel': 17, 'Mono': 9},
-                      'MPEG-2.5': {'Stereo': 17, 'Joint stereo': 17,
+                      'MPEG-2.5': {'Stereo': 17, 'Joint stereo (Stereo)': 17,
                                    'Dual channel': 17, 'Mono': 9}}
+vbri_header_offset = 32
 
 samp_per_frame = {'MPEG-1': {'Layer 1': 384, 'Layer 2': 1152, 'Layer 3': 1152},
                   'MPEG-2': {'Layer 1': 384, 'Layer 2': 1152, 'Layer 3': 576},
                   'MPEG-2.5': {'Layer 1': 384, 'Layer 2': 1152, 'Layer 3': 576}
                   }
 
-sampling_rate_index = {'MPEG-1': {'00': 44100, '01': 48000, '10': 32000},
-                       'MPEG-2': {'00': 22050, '01': 24000, '10': 16000},
-                       'MPEG-2.5': {'00': 11025, '01': 12000, '10': 8000}}
+sampling_rate_index = {'MPEG-1': (44100, 48000, 32000),
+                       'MPEG-2': (22050, 24000, 16000),
+                       'MPEG-2.5': (11025, 12000, 8000)}
 
-bitrate_index = {'MPEG-1 Layer 3': {'0001': 32, '0010': 40, '0011': 48,
-                                    '0100': 56, '0101': 64, '0110': 80,
-                                    '0111': 96, '1000': 112, '1001': 128,
-                                    '1010': 160, '1011': 192, '1100': 224,
-                                    '1101': 256, '1110': 320}}
+# Кб/с по индексу битрейта; 0 - свободный формат, индекс 15 недопустим
+bitrate_index = {'MPEG-1 Layer 1': (0, 32, 64, 96, 128, 160, 192, 224, 256,
+                                    288, 320, 352, 384, 416, 448),
+                 'MPEG-1 Layer 2': (0, 32, 48, 56, 64, 80, 96, 112, 128,
+                                    160, 192, 224, 256, 320, 384),
+                 'MPEG-1 Layer 3': (0, 32, 40, 48, 56, 64, 80, 96, 112,
+                                    128, 160, 192, 224, 256, 320),
+                 'MPEG-2 Layer 1': (0, 32, 48, 56, 64, 80, 96, 112, 128,
+                                    144, 160, 176, 192, 224, 256),
+                 'MPEG-2 Layer 2': (0, 8, 16, 24, 32, 40, 48, 56, 64,
+                                    80, 96, 112, 128, 144, 160),
+                 'MPEG-2 Layer 3': (0, 8, 16, 24, 32, 40, 48, 56, 64,
+                                    80, 96, 112, 128, 144, 160)}
+bitrate_index['MPEG-2.5 Layer 1'] = bitrate_index['MPEG-2 Layer 1']
+bitrate_index['MPEG-2.5 Layer 2'] = bitrate_index['MPEG-2 Layer 2']
+bitrate_index['MPEG-2.5 Layer 3'] = bitrate_index['MPEG-2 Layer 3']
 
 genre = {0: 'Blues',
          1: 'Classic Rock',
@@ -0,0 +1,132 @@
+import os
+import sqlite3
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from mp3 import Mp3Info
+from id3 import write_tag
+
+default_path = os.path.join(os.path.expanduser('~'), '.mp3_library.sqlite')
+
+fields = ('Path', 'Size', 'Mtime', 'Title', 'Artist', 'Album', 'Year',
+          'Genre', 'Duration', 'Bitrate', 'VBR', 'Error')
+# кадры ID3v2 (v2.3/2.4 и v2.2), затем поля ID3v1
+tag_fields = {'Title': ('TIT2', 'TT2', 'Title'),
+              'Artist': ('TPE1', 'TP1', 'Artist'),
+              'Album': ('TALB', 'TAL', 'Album'),
+              'Year': ('TYER', 'TDRC', 'TYE', 'Year'),
+              'Genre': ('TCON', 'TCO', 'Genre')}
+
+
+def find_mp3_files(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for file in sorted(files):
+                    if file[-4:] == '.mp3':
+                        yield os.path.abspath(os.path.join(root, file))
+        elif path[-4:] == '.mp3':
+            yield os.path.abspath(path)
+
+
+def get_key(file_name):
+    stat = os.stat(file_name)
+    return stat.st_size, stat.st_mtime_ns
+
+
+def read_track(file_name):
+    row = OrderedDict((field, None) for field in fields)
+    row['Path'] = file_name
+
+    try:
+        row['Size'], row['Mtime'] = get_key(file_name)
+        # длительность берётся из заголовка Xing/VBRI, если он есть
+        mp3_info = Mp3Info(file_name, index_frames=False)
+        for field, keys in tag_fields.items():
+            for key in keys:
+                value = mp3_info.info.get(key)
+                if type(value) == str and value.strip('\x00 '):
+                    row[field] = value.strip('\x00 ')
+                    break
+
+        row['Duration'] = round(mp3_info.stream_info['Duration'], 3)
+        row['Bitrate'] = round(mp3_info.stream_info['Average bitrate'])
+        row['VBR'] = int(mp3_info.stream_info['VBR'])
+    except Exception as e:
+        # любая ошибка разбора остаётся в строке файла, а не прерывает
+        # обход всей библиотеки
+        row['Error'] = str(e.args[-1]) if e.args else type(e).__name__
+
+    return row
+
+
+def write_tags(paths, changes):
+    # (файл, True/False из id3.write_tag или исключение) по каждому
+    # файлу; аудиоданные не разбираются, каталог подхватит изменения
+    # при следующем update
+    for file_name in find_mp3_files(paths):
+        try:
+            yield file_name, write_tag(file_name, changes)
+        except (AttributeError, OSError) as e:
+            yield file_name, e
+
+
+class Library:
+    # Каталог треков в sqlite. Повторный обход разбирает только файлы,
+    # у которых изменились размер или время изменения
+
+    def __init__(self, path=default_path):
+        self.connection = sqlite3.connect(path)
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS tracks ('
+            'path TEXT PRIMARY KEY, size INTEGER, mtime INTEGER, '
+            'title TEXT, artist TEXT, album TEXT, year TEXT, genre TEXT, '
+            'duration REAL, bitrate INTEGER, vbr INTEGER, error TEXT)')
+
+    def get_keys(self):
+        return {path: (size, mtime) for path, size, mtime in
+                self.connection.execute(
+                    'SELECT path, size, mtime FROM tracks')}
+
+    def update(self, paths, workers=None, chunksize=32):
+        # (разобрано файлов, удалено записей)
+        file_names = list(find_mp3_files(paths))
+        known = self.get_keys()
+        changed = []
+        for file_name in file_names:
+            try:
+                if known.get(file_name) != get_key(file_name):
+                    changed.append(file_name)
+            except OSError:
+                pass
+
+        try:
+            with ProcessPoolExecutor(workers) as executor:
+                rows = executor.map(read_track, changed, chunksize=chunksize)
+                self.connection.executemany(
+                    'INSERT OR REPLACE INTO tracks VALUES '
+                    '(?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)',
+                    (tuple(row.values()) for row in rows))
+            removed = self.remove_missing(paths, set(file_names), known)
+        finally:
+            # строки, записанные до сбоя пула процессов, не пропадают
+            self.connection.commit()
+        return len(changed), removed
+
+    def remove_missing(self, paths, file_names, known):
+        # записи об удалённых файлах из обойденных каталогов
+        roots = tuple(os.path.join(os.path.abspath(path), '')
+                      for path in paths if os.path.isdir(path))
+        missing = [(path,) for path in known
+                   if path.startswith(roots) and path not in file_names]
+        self.connection.executemany('DELETE FROM tracks WHERE path = ?',
+                                    missing)
+        return len(missing)
+
+    def tracks(self):
+        for values in self.connection.execute(
+                'SELECT * FROM tracks ORDER BY path'):
+            yield OrderedDict(zip(fields, values))
+
+    def close(self):
+        self.connection.close()
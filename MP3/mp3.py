@@ -1,7 +1,27 @@
-from collections import OrderedDict
+import os
+import re
+from array import array
+from struct import Struct
+from threading import Lock
+from itertools import accumulate
+from types import MappingProxyType
+from collections import OrderedDict, namedtuple
+from concurrent.futures import ThreadPoolExecutor
+from id3 import Id3Tag, write_tag
 from info import speed, protection, copyright, original, emphasis, \
     tag_version, mpeg_version, layer_version, channel_mode, \
-    sampling_rate_index, bitrate_index, genre
+    sampling_rate_index, bitrate_index, samp_per_frame, xing_header_offset, \
+    vbri_header_offset, genre
+
+frame_header = Struct('>I')
+# результат разбора одного файла; словари в нём только для чтения.
+# tag и frames - общие объекты, а не копии: разбор их больше не меняет,
+# но FrameIndex.load() дописывает недочитанные кадры в тот же индекс
+Mp3Data = namedtuple('Mp3Data', ('filename', 'frame_info', 'byte_info',
+                                 'vbr_info', 'stream_info', 'tag', 'frames',
+                                 'garbage'))
+# сколько байт файла читается за раз при обходе кадров
+READ_BLOCK = 65536
 
 
 def int_from_bytes(bytes_line):
@@ -22,18 +42,137 @@ def bin_from_int(int_number, bits_count=8):
     return result
 
 
+def get_header_tables():
+    # длина кадра и битрейт по битам 9-20 заголовка: версия, слой, защита,
+    # битрейт, частота, заполнение; 0 - недопустимое сочетание полей
+    lengths = array('H', bytes(2 * 4096))
+    bitrates = array('H', bytes(2 * 4096))
+    for index in range(4096):
+        mpeg = mpeg_version.get(index >> 10)
+        layer = layer_version.get(index >> 8 & 3)
+        bitrate_bits = index >> 3 & 15
+        rate_bits = index >> 1 & 3
+        padding = index & 1
+        if mpeg is None or layer is None or rate_bits == 3 or \
+                bitrate_bits in (0, 15):  # свободный формат не поддержан
+            continue
+
+        bitrate = bitrate_index['{} {}'.format(mpeg, layer)][bitrate_bits]
+        sample_rate = sampling_rate_index[mpeg][rate_bits]
+        if layer == 'Layer 1':
+            length = (12 * bitrate * 1000 // sample_rate + padding) * 4
+        else:
+            slots = samp_per_frame[mpeg][layer] // 8
+            length = slots * bitrate * 1000 // sample_rate + padding
+        lengths[index] = length
+        bitrates[index] = bitrate
+    return lengths, bitrates
+
+
+frame_lengths, frame_bitrates = get_header_tables()
+max_frame_length = max(frame_lengths)
+# поля, которые не меняются внутри потока: синхрослово, версия, слой,
+# частота дискретизации
+stream_mask = 0xfffe0c00
+# сколько следующих заголовков должно совпасть, чтобы принять кадр
+# после потери синхронизации
+CONFIRM_FRAMES = 2
+
+
+def get_sync_pattern():
+    # Заголовки, для которых в таблицах есть длина кадра: версия, слой,
+    # битрейт и частота без зарезервированных значений, emphasis не 2.
+    # Поиск по нему перескакивает мусор за один вызов re
+    alternatives = []
+    for byte1 in range(0xe0, 0x100):
+        seconds = bytes(byte2 for byte2 in range(256) if
+                        frame_lengths[(byte1 & 0x1f) << 7 | byte2 >> 1])
+        if seconds:
+            alternatives.append(re.escape(bytes((byte1,))) +
+                                get_byte_class(seconds))
+    thirds = get_byte_class(bytes(byte3 for byte3 in range(256)
+                                  if byte3 & 3 != 2))
+    return re.compile(b'\xff(?:' + b'|'.join(alternatives) + b')' + thirds)
+
+
+def get_byte_class(values):
+    return b'[' + b''.join(re.escape(bytes((value,))) for value in values) \
+        + b']'
+
+
+sync_pattern = get_sync_pattern()
+# по скольким первым кадрам файл без Xing/VBRI признаётся CBR
+CBR_PROBE_FRAMES = 8
+
+
+def get_frame_length(header, stream=None):
+    # 0 - не заголовок кадра или заголовок другого потока
+    if header >> 21 != 0x7ff or header & 3 == 2:
+        return 0
+    if stream is not None and header & stream_mask != stream:
+        return 0
+    return frame_lengths[header >> 9 & 0xfff]
+
+
+class FrameIndex:
+    # Смещения, длины и битрейты (Кб/с) всех кадров в компактных массивах.
+    # При разборе без index_frames в индексе только первые кадры, а
+    # remainder - (файл, смещение, конец аудио, поток) для остальных:
+    # их дочитывает load(), когда индекс действительно нужен
+
+    def __init__(self):
+        self.offsets = array('Q')
+        self.lengths = array('H')
+        self.bitrates = array('H')
+        self.remainder = None
+        self.lock = Lock()
+
+    @property
+    def complete(self):
+        return self.remainder is None
+
+    def load(self):
+        with self.lock:
+            if self.remainder is None:
+                return
+            filename, position, end, stream = self.remainder
+            parser = Mp3Parser()
+            parser.frames = self
+            parser.stream = parser.known_stream = stream
+            with open(filename, 'rb') as file:
+                parser.read_frames(file, position, end)
+            self.remainder = None
+
+    def append(self, offset, length, bitrate):
+        self.offsets.append(offset)
+        self.lengths.append(length)
+        self.bitrates.append(bitrate)
+
+    def __len__(self):
+        return len(self.offsets)
+
+
 class Mp3Parser:
     def __init__(self):
-        self.byte_info = {}
-        self.frame_info = {}
-        self.frames_count = 0
+        self.clear()
 
     def clear(self):
         self.byte_info = {}
         self.frame_info = {}
+        self.vbr_info = {}
+        self.tag = Id3Tag(None)
+        self.frames = FrameIndex()
+        self.garbage = []
+        self.stream = None  # поля заголовков подтверждённого потока
+        self.known_stream = None  # последний подтверждённый поток
         self.frames_count = 0
+        self.audio_end = 0
 
-    def parse(self, filename):
+    def parse(self, filename, index_frames=True):
+        # файл читается кусками: тег ID3v2 в начале, ID3v1 в конце,
+        # между ними - только заголовки кадров. Без index_frames кадры
+        # не обходятся, если число кадров есть в заголовке Xing или VBRI
+        # или первые кадры файла без этих заголовков - CBR
         self.clear()
 
         if filename[-4:] != '.mp3':
@@ -41,101 +180,373 @@ class Mp3Parser:
 
         try:
             with open(filename, 'rb') as file:
-                data = file.read()
-                tag_pos = data.find(b'TAG')
-                id3_pos = data.find(b'ID3')
-                if tag_pos != -1:
-                    self.read_id3v1_tag(data, tag_pos)
-                if id3_pos != -1:
-                    self.read_id3v2_tag(data, id3_pos)
-
-                search_index = 0
-                while True:
-                    frame_header_index = data.find(b'\xff\xfb', search_index)
-
-                    if frame_header_index == -1:
-                        break
-
-                    search_index += self.read_frame(frame_header_index, data)
+                size = os.fstat(file.fileno()).st_size
+                self.tag = Id3Tag(filename)
+                start = self.tag.read(file)
+                end = self.read_id3v1_tag(file, size)
+                self.audio_end = end
+                position = self.read_frames(file, start, end, 1)
+                if self.frames:
+                    self.read_vbr_header(file)
+                if not index_frames and not self.vbr_info:
+                    position = self.read_frames(file, position, end,
+                                                CBR_PROBE_FRAMES)
+                if index_frames or not self.is_estimable():
+                    self.read_frames(file, position, end)
+                else:
+                    self.frames.remainder = filename, position, end, \
+                        self.stream
         except FileNotFoundError:
             raise FileNotFoundError("Incorrect filename")
 
-    def read_id3v1_tag(self, data, index):
-        if data[index + 3] != 45:  # 45 - ascii код символа '+'
-            self.byte_info['id3v1'] = data[index + 3: index + 128]
-        else:
-            self.byte_info['id3v1+'] = data[index + 4:index + 227]
+        return Mp3Data(filename, MappingProxyType(self.frame_info),
+                       MappingProxyType(self.byte_info),
+                       MappingProxyType(self.vbr_info),
+                       MappingProxyType(self.get_stream_info()),
+                       self.tag, self.frames, tuple(self.garbage))
+
+    def read_id3v1_tag(self, file, size):
+        # тег занимает последние 128 байт, расширенный - ещё 227 перед ним;
+        # возвращает конец аудиоданных
+        if size < 128:
+            return size
+        file.seek(size - 128)
+        data = file.read(128)
+        if data[:3] != b'TAG':
+            return size
+        self.byte_info['id3v1'] = data[3:]
+
+        if size >= 355:
+            file.seek(size - 355)
+            data = file.read(227)
+            if data[:4] == b'TAG+':
+                self.byte_info['id3v1+'] = data[4:]
+                return size - 355
+        return size - 128
+
+    def read_frames(self, file, position, end, limit=None):
+        # От кадра к кадру по длинам из таблицы, через буфер постоянного
+        # размера. Пока поток не подтверждён, кандидат принимается, только
+        # если за ним идут CONFIRM_FRAMES согласованных заголовков; каждый
+        # байт проверяется не больше одного раза, так что ложные
+        # синхрослова не делают обход квадратичным. Участки между кадрами
+        # записываются в garbage. Возвращает смещение, с которого обход
+        # можно продолжить
+        window = (CONFIRM_FRAMES + 1) * max_frame_length
+        base = position
+        buffer = b''
+        stream = self.stream
+        garbage_start = None
+        while position + 4 <= end and len(self.frames) != limit:
+            relative = position - base
+            if relative + 4 > len(buffer) or stream is None and \
+                    relative + window > len(buffer) and \
+                    base + len(buffer) < end:
+                file.seek(position)
+                buffer = file.read(min(READ_BLOCK, end - position))
+                base, relative = position, 0
+                if len(buffer) < 4:
+                    break
+
+            header = frame_header.unpack_from(buffer, relative)[0]
+            length = get_frame_length(header, stream)
+            if length and stream is None:
+                # конец файла сразу за кандидатом подтверждает его, только
+                # если это продолжение уже подтверждённого потока или
+                # кандидат стоит в самом начале аудиоданных
+                trusted = header & stream_mask == self.known_stream or \
+                    not self.frames and garbage_start is None
+                if self.is_confirmed(buffer, relative, length, base, end,
+                                     trusted):
+                    stream = self.known_stream = header & stream_mask
+                else:
+                    length = 0
+
+            if not length:
+                if garbage_start is None:
+                    garbage_start = position
+                stream = None
+                # заголовок, разрезанный концом буфера, найдётся после
+                # чтения следующего блока с последних трёх байт
+                found = self.find_candidate(buffer, relative + 1)
+                position = base + (found if found is not None else
+                                   max(relative + 1, len(buffer) - 3))
+                continue
+
+            if garbage_start is not None:
+                self.garbage.append((garbage_start, position - garbage_start))
+                garbage_start = None
+            if not self.frame_info:
+                self.set_frame_info(header)
+            self.frames.append(position, length,
+                               frame_bitrates[header >> 9 & 0xfff])
+            position += length
+
+        if garbage_start is not None:
+            self.garbage.append((garbage_start, end - garbage_start))
+        self.stream = stream
+        self.frames_count = len(self.frames)
+        return position
+
+    def is_estimable(self):
+        # длительность известна без обхода кадров: число кадров есть
+        # в Xing/VBRI или первые CBR_PROBE_FRAMES кадров одного битрейта
+        if 'Frames' in self.vbr_info:
+            return True
+        bitrates = self.frames.bitrates
+        return not self.vbr_info and len(bitrates) == CBR_PROBE_FRAMES \
+            and min(bitrates) == max(bitrates)
 
-    def read_id3v2_tag(self, data, index):
-        if data[index + 3] < 5:
-            tags_length = self.get_id3v2_tag_length(data[index+6: index+10])
-            self.byte_info['id3v2'] = data[index + 3:index + 10]
-            self.byte_info['tags'] = data[index + 10: index + 10 + tags_length]
+    @staticmethod
+    def find_candidate(buffer, start):
+        # ближайший заголовок из таблиц, за которым в буфере идёт заголовок
+        # того же потока или конец буфера; прочие отсеиваются здесь, не
+        # доходя до is_confirmed
+        for match in sync_pattern.finditer(buffer, start):
+            relative = match.start()
+            header = frame_header.unpack_from(buffer, relative)[0]
+            following = relative + frame_lengths[header >> 9 & 0xfff]
+            if following + 4 > len(buffer) or get_frame_length(
+                    frame_header.unpack_from(buffer, following)[0],
+                    header & stream_mask):
+                return relative
+        return None
 
     @staticmethod
-    def get_id3v2_tag_length(len_bytes):
-        binary_number = ''
-        for byte in len_bytes:
-            binary = bin_from_int(byte)[1:]
-            binary_number += binary
-        return int(binary_number, 2)
-
-    def read_frame(self, index, data):
-        header = data[index:index + 4]
-        bin_header = bin_from_int(int_from_bytes(header), 32)
-        self.set_frame_info(bin_header)
-        frame_length = self.get_frame_lenght()
-        self.frames_count += 1 if frame_length != 0 else 0
-        return 4 + frame_length
+    def is_confirmed(buffer, relative, length, base, end, trusted):
+        # следующие кадры того же потока; с trusted конец аудиоданных
+        # ровно на границе кадра тоже подтверждение
+        stream = frame_header.unpack_from(buffer, relative)[0] & stream_mask
+        for checked in range(CONFIRM_FRAMES):
+            relative += length
+            if base + relative == end:
+                return trusted
+            if relative + 4 > len(buffer):
+                # последний кадр обрезан концом файла
+                return trusted and checked > 0 and base + len(buffer) >= end
+            header = frame_header.unpack_from(buffer, relative)[0]
+            length = get_frame_length(header, stream)
+            if not length:
+                return False
+        return True
+
+    def read_vbr_header(self, file):
+        # Xing/Info лежит в первом кадре сразу за side info, VBRI - на
+        # постоянном смещении; первый кадр тогда не содержит звука
+        file.seek(self.frames.offsets[0])
+        data = file.read(self.frames.lengths[0])
+        mpeg = self.frame_info['Audio version ID']
+        offset = 4 + xing_header_offset[mpeg][self.frame_info['Channel mode']]
+        if self.frame_info['Protection bit'] == 0:
+            offset += 2  # CRC после заголовка кадра
+
+        if data[offset:offset + 4] in (b'Xing', b'Info'):
+            self.read_xing_header(data, offset)
+        elif data[4 + vbri_header_offset:8 + vbri_header_offset] == b'VBRI':
+            self.read_vbri_header(data, 4 + vbri_header_offset)
+
+    def read_xing_header(self, data, offset):
+        self.vbr_info['Type'] = data[offset:offset + 4].decode('ascii')
+        flags = int_from_bytes(data[offset + 4:offset + 8])
+        offset += 8
+        for flag, key, size in ((1, 'Frames', 4), (2, 'Bytes', 4),
+                                (4, 'TOC', 100), (8, 'Quality', 4)):
+            if flags & flag:
+                value = data[offset:offset + size]
+                self.vbr_info[key] = value if key == 'TOC' \
+                    else int_from_bytes(value)
+                offset += size
+
+    def read_vbri_header(self, data, offset):
+        self.vbr_info['Type'] = 'VBRI'
+        self.vbr_info['Bytes'] = int_from_bytes(data[offset + 10:offset + 14])
+        self.vbr_info['Frames'] = int_from_bytes(data[offset + 14:offset + 18])
+        entries = int_from_bytes(data[offset + 18:offset + 20])
+        scale = int_from_bytes(data[offset + 20:offset + 22])
+        entry_size = int_from_bytes(data[offset + 22:offset + 24])
+        self.vbr_info['Frames per entry'] = \
+            int_from_bytes(data[offset + 24:offset + 26])
+
+        toc = []
+        offset += 26
+        for i in range(entries):
+            entry = data[offset + i * entry_size:
+                         offset + (i + 1) * entry_size]
+            toc.append(int_from_bytes(entry) * scale)
+        self.vbr_info['TOC'] = toc
+
+    def get_stream_info(self):
+        # длительность (с), средний битрейт (Кб/с) и признак VBR:
+        # по заголовку Xing/VBRI, если он есть, для недочитанного CBR -
+        # по размеру аудиоданных, иначе по индексу кадров
+        if not self.frame_info:
+            return {}
+
+        mpeg = self.frame_info['Audio version ID']
+        layer = self.frame_info['Layer index']
+        sample_rate = self.frame_info['Sampling rate index']
+        frame_duration = samp_per_frame[mpeg][layer] / sample_rate
+        vbr_type = self.vbr_info.get('Type')
+
+        if 'Frames' in self.vbr_info:
+            frames = self.vbr_info['Frames']
+            duration = frames * frame_duration
+            if 'Bytes' in self.vbr_info and duration:
+                bitrate = self.vbr_info['Bytes'] * 8 / duration / 1000
+            else:
+                bitrate = self.frame_info['Bitrate index']
+            vbr = vbr_type != 'Info'
+        elif not self.frames.complete:
+            bitrate = self.frame_info['Bitrate index']
+            duration = (self.audio_end - self.frames.offsets[0]) * 8 / \
+                (bitrate * 1000)
+            frames = round(duration / frame_duration)
+            vbr = False
+        else:
+            # кадр с заголовком Xing/VBRI служебный
+            bitrates = self.frames.bitrates[1 if vbr_type else 0:]
+            frames = len(bitrates)
+            duration = frames * frame_duration
+            bitrate = sum(bitrates) / frames if frames else 0
+            vbr = vbr_type in ('Xing', 'VBRI') or \
+                frames > 0 and min(bitrates) != max(bitrates)
+
+        return {'Frames': frames, 'Duration': duration,
+                'Average bitrate': bitrate, 'VBR': vbr}
 
     def set_frame_info(self, header):
+        # разбор полей одного заголовка, прочим кадрам хватает таблиц
         cache = self.frame_info.copy()
         try:
-            self.frame_info['Audio version ID'] = mpeg_version[header[11:13]]
-            self.frame_info['Layer index'] = layer_version[header[13:15]]
-            self.frame_info['Protection bit'] = header[15]
-
-            mpeg = self.frame_info['Audio version ID']
-            layer = self.frame_info['Layer index']
+            mpeg = mpeg_version[header >> 19 & 3]
+            layer = layer_version[header >> 17 & 3]
             key = '{} {}'.format(mpeg, layer)
 
+            self.frame_info['Audio version ID'] = mpeg
+            self.frame_info['Layer index'] = layer
+            self.frame_info['Protection bit'] = header >> 16 & 1
             self.frame_info['Bitrate index'] = \
-                bitrate_index[key][header[16:20]]
-
+                bitrate_index[key][header >> 12 & 15]
             self.frame_info['Sampling rate index'] = \
-                sampling_rate_index[mpeg][header[20:22]]
-
-            self.frame_info['Padding bit'] = int_from_bin(header[22])
-            self.frame_info['Channel mode'] = channel_mode[header[24:26]]
-            self.frame_info['Copyright bit'] = copyright[header[28]]
-            self.frame_info['Original bit'] = original[header[29]]
-            self.frame_info['Emphasis'] = emphasis[header[30:]]
-        except KeyError:
+                sampling_rate_index[mpeg][header >> 10 & 3]
+            self.frame_info['Padding bit'] = header >> 9 & 1
+            self.frame_info['Channel mode'] = channel_mode[header >> 6 & 3]
+            self.frame_info['Copyright bit'] = copyright[header >> 3 & 1]
+            self.frame_info['Original bit'] = original[header >> 2 & 1]
+            self.frame_info['Emphasis'] = emphasis[header & 3]
+        except (KeyError, IndexError):
             self.frame_info = cache
 
-    def get_frame_lenght(self):
-        if self.frame_info != {}:
-            bitrate = self.frame_info['Bitrate index'] * 1000
-            sample_rate = self.frame_info['Sampling rate index']
-            padding = self.frame_info['Padding bit']
-            return 144*bitrate//sample_rate + padding
-        return 0
+
+class SeekTable:
+    # Время (с) -> смещение кадра в файле за O(1) по индексу кадров.
+    # Недочитанный индекс дочитывается при первом locate; оглавление
+    # Xing или VBRI и битрейт CBR - запасной путь, если файл уже не прочесть
+
+    def __init__(self, mp3_data):
+        stream_info = mp3_data.stream_info
+        self.frames = mp3_data.frames
+        self.vbr_info = mp3_data.vbr_info
+        self.duration = stream_info.get('Duration', 0)
+        frames_count = stream_info.get('Frames', 0)
+        self.frame_duration = self.duration / frames_count \
+            if frames_count else 0
+        self.bytes_per_second = stream_info.get('Average bitrate', 0) * 125
+
+        # кадр с заголовком Xing/VBRI служебный, звук начинается за ним
+        self.first = 1 if self.vbr_info.get('Type') else 0
+        self.audio_start = self.frames.offsets[0] if self.frames else 0
+        if self.first and self.frames:
+            self.audio_start += self.frames.lengths[0]
+        self.vbri_offsets = [0] + list(accumulate(self.vbr_info['TOC'])) \
+            if self.vbr_info.get('Type') == 'VBRI' else None
+
+    def locate(self, seconds):
+        # (время начала кадра, смещение в файле)
+        if not self.frame_duration:
+            return 0, self.audio_start
+        seconds = min(max(seconds, 0), self.duration)
+        if not self.frames.complete:
+            try:
+                self.frames.load()
+            except OSError:
+                pass
+
+        if self.frames.complete and len(self.frames) > self.first + 1:
+            frame = min(int(seconds / self.frame_duration),
+                        len(self.frames) - self.first - 1)
+            return frame * self.frame_duration, \
+                self.frames.offsets[self.first + frame]
+
+        if self.vbri_offsets is not None:
+            entry_duration = self.vbr_info['Frames per entry'] * \
+                self.frame_duration
+            entry = min(int(seconds / entry_duration),
+                        len(self.vbri_offsets) - 1)
+            return entry * entry_duration, \
+                self.audio_start + self.vbri_offsets[entry]
+
+        if 'TOC' in self.vbr_info and 'Bytes' in self.vbr_info:
+            # 100 точек: доля файла (из 256) для каждого процента времени
+            toc = self.vbr_info['TOC']
+            percent = seconds / self.duration * 100
+            point = min(int(percent), 99)
+            lower = toc[point]
+            upper = toc[point + 1] if point < 99 else 256
+            fraction = lower + (upper - lower) * (percent - point)
+            return seconds, max(self.audio_start, self.frames.offsets[0] +
+                                int(fraction / 256 * self.vbr_info['Bytes']))
+
+        return seconds, self.audio_start + \
+            int(seconds * self.bytes_per_second)
+
+
+def parse(filename, index_frames=True):
+    # свой Mp3Parser на каждый вызов: разбор можно вести из разных потоков
+    return Mp3Parser().parse(filename, index_frames)
+
+
+def parse_many(filenames, workers=None, index_frames=True):
+    # Разбор файлов пулом потоков. Результаты (Mp3Data) выдаются в порядке
+    # filenames; вместо результата файла, который разобрать не удалось,
+    # выдаётся исключение. Потоки ускоряют разбор, пока узкое место -
+    # ввод-вывод (сетевой диск, холодный кэш); разбор заголовков в памяти
+    # упирается в GIL, для него есть library.Library с пулом процессов
+    def try_parse(filename):
+        try:
+            return parse(filename, index_frames)
+        except (AttributeError, OSError, KeyError, IndexError) as e:
+            return e
+
+    with ThreadPoolExecutor(workers) as executor:
+        yield from executor.map(try_parse, filenames)
 
 
 class Mp3Info:
-    parser = Mp3Parser()
+    def __init__(self, filename, index_frames=True):
+        self.filename = filename
+        self.index_frames = index_frames
+        self.load()
 
-    def __init__(self, filename):
+    def load(self):
         self.info = OrderedDict()
-        self.filename = filename
-        self.parser.parse(filename)
-        self.frame_info = self.parser.frame_info
-        self.byte_info = self.parser.byte_info
-        self.keyset = self.parser.byte_info.keys()
+        self.data = parse(self.filename, self.index_frames)
+        self.frame_info = self.data.frame_info
+        self.byte_info = self.data.byte_info
+        self.stream_info = self.data.stream_info
+        self.keyset = self.data.byte_info.keys()
         self.set_info()
 
+    def write_tags(self, changes):
+        # {кадр ID3v2: текст или None}; True - тег переписан на месте,
+        # False - файлу понадобился тег большего размера
+        in_place = write_tag(self.filename, changes)
+        self.load()
+        return in_place
+
     def set_info(self):
         self.set_frame_info()
+        self.set_stream_info()
         self.set_header_info()
 
     def set_frame_info(self):
@@ -157,14 +568,27 @@ class Mp3Info:
         self.info['Original Bit'] = self.frame_info['Original bit']
         self.info['Emphasis'] = self.frame_info['Emphasis']
 
+    def set_stream_info(self):
+        if not self.stream_info:
+            return
+        minutes, seconds = divmod(self.stream_info['Duration'], 60)
+        self.info['Duration'] = '{}:{:06.3f}'.format(int(minutes), seconds)
+        self.info['Average Bitrate'] = '{:.0f} Kb/sec'.format(
+            self.stream_info['Average bitrate'])
+
+        vbr_type = self.data.vbr_info.get('Type')
+        mode = 'VBR' if self.stream_info['VBR'] else 'CBR'
+        self.info['VBR Mode'] = '{} ({} header)'.format(mode, vbr_type) \
+            if vbr_type is not None else mode
+
     def set_header_info(self):
         if 'id3v1' in self.keyset:
             self.set_id3v1_header_info(self.byte_info['id3v1'])
         if 'id3v1+' in self.keyset:
             self.set_ext_id3v1_header_info(self.byte_info['id3v1+'])
-        if 'id3v2' in self.keyset:
-            self.set_id3v2_header_info(self.byte_info['id3v2'])
-            self.set_tags_info(self.byte_info['tags'])
+        if self.data.tag.version is not None:
+            self.info['ID3v2 Version'] = tag_version[self.data.tag.version]
+            self.set_tags_info(self.data.tag)
 
     def set_id3v1_header_info(self, data):
         self.info['ID3v1 Version'] = 'ID3v1.0'
@@ -191,46 +615,12 @@ class Mp3Info:
         self.info['Start time'] = data[211:217].decode('latin-1')
         self.info['End time'] = data[217:223].decode('latin-1')
 
-    def set_id3v2_header_info(self, data):
-        version = data[0]
-        self.info['ID3v2 Version'] = tag_version[version]
-
-    def set_tags_info(self, data):
-        i = 0
-        data_len = len(data)
-        while i < data_len - 1:
-            try:
-                if self.info['ID3v2 Version'] == 'ID3v2.2':
-                    tag, tag_data = self.try_get_next_triple_tag(data, i)
-                    i += 7 + len(tag_data)
-                else:
-                    tag, tag_data = self.try_get_next_quadruple_tag(data, i)
-                    i += 10 + len(tag_data)
-            except UnicodeDecodeError:
-                return
-            self.set_tag_info(tag, tag_data)
-
-    def set_tag_info(self, tag, tag_data):
-        if tag not in ('', 'PIC', 'APIC') and tag_data != b'':
-            if tag in self.info.keys():
-                self.info[tag] += tag_data
-            else:
-                self.info[tag] = tag_data
-
-    @staticmethod
-    def try_get_next_triple_tag(data, i):
-        tag = data[i:i + 3].decode('ascii')
-        size = int_from_bytes(data[i + 3:i + 6])
-        tag_data = data[i + 7:i + 6 + size]
-        return tag, tag_data
-
-    @staticmethod
-    def try_get_next_quadruple_tag(data, i):
-        tag = data[i:i + 4].decode('ascii')
-        size = int_from_bytes(data[i + 4:i + 8])
-        tag_data = data[i + 10:i + 10 + size]
-        i += 10 + size
-        return tag, tag_data
+    def set_tags_info(self, tag):
+        for frame_id, value in tag.frames.items():
+            self.info[frame_id] = value
+        if tag.pictures:
+            self.info['Pictures'] = '; '.join(
+                str(picture) for picture in tag.pictures)
 
     def __str__(self):
         result = ''
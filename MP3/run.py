@@ -1,6 +1,7 @@
 import sys
 import argparse
 from mp3 import Mp3Info
+from library import Library, default_path, write_tags
 from graphics import MainWindow
 from PyQt5.QtWidgets import QApplication
 
@@ -11,17 +12,58 @@ def try_start_console_mode():
 
     parser.add_argument('-f', '--file', type=str,
                         help='print mp3 file info into console')
+    parser.add_argument('-l', '--library', type=str, nargs='+',
+                        help='index mp3 files in directories into a catalog, '
+                             'reparsing only changed files')
+    parser.add_argument('--catalog', type=str, default=default_path,
+                        help='sqlite catalog file for --library')
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help='processes for --library (default: CPU count)')
+    parser.add_argument('-t', '--tag', type=str, nargs='+',
+                        help='mp3 files or directories to write ID3v2 '
+                             'text frames from --set into')
+    parser.add_argument('-s', '--set', type=str, nargs='+', default=[],
+                        metavar='FRAME=TEXT',
+                        help='text frames for --tag, e.g. TIT2=Title; '
+                             'an empty TEXT removes the frame')
 
-    args = parser.parse_args()
-    return args.file
+    return parser.parse_args()
+
+
+def get_changes(values):
+    changes = {}
+    for value in values:
+        frame_id, _, text = value.partition('=')
+        changes[frame_id] = text or None
+    return changes
 
 
 if __name__ == '__main__':
-    filename = try_start_console_mode()
+    args = try_start_console_mode()
+    filename = args.file
+
+    if args.library:
+        library = Library(args.catalog)
+        parsed, removed = library.update(args.library, args.workers)
+        library.close()
+        print('Parsed {} new or changed files, removed {} missing'.format(
+            parsed, removed))
+        exit()
+
+    if args.tag:
+        counts = {True: 0, False: 0}
+        for file_name, result in write_tags(args.tag, get_changes(args.set)):
+            if isinstance(result, Exception):
+                print('{}: {}'.format(file_name, result))
+            else:
+                counts[result] += 1
+        print('Tagged {} files in place, rewrote {} with a larger tag'.format(
+            counts[True], counts[False]))
+        exit()
 
     if filename:
         try:
-            print(Mp3Info(filename))
+            print(Mp3Info(filename, index_frames=False))
         except AttributeError as e:
             print(e.args[0])
         exit()
@@ -1,11 +1,25 @@
 import os
 import sys
+import shutil
+import tempfile
 import unittest
+from unittest import mock
 
 sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
                              os.path.pardir))
 
-from mp3 import Mp3Info, Mp3Parser, int_from_bin, int_from_bytes, bin_from_int
+from mp3 import Mp3Info, Mp3Parser, int_from_bin, int_from_bytes, \
+    bin_from_int, frame_lengths, frame_bitrates, SeekTable, parse, \
+    parse_many, sync_pattern, CBR_PROBE_FRAMES
+from id3 import Id3Tag, int_from_syncsafe, write_tag, TAG_PADDING
+from library import Library, read_track, write_tags
+from timeline import Timeline, get_timeline, get_global_gain
+
+try:
+    from PyQt5.QtCore import Qt
+    from hex_model import HexModel
+except ImportError:
+    HexModel = None
 
 
 class TestCastFunctions(unittest.TestCase):
@@ -65,6 +79,254 @@ class TestMp3Parsing(unittest.TestCase):
         self.assertTrue(parser.byte_info)
         self.assertTrue(parser.frames_count != 0)
 
+    def test_header_tables(self):
+        index = 0xfffb9064 >> 9 & 0xfff
+        self.assertEqual(417, frame_lengths[index])
+        self.assertEqual(418, frame_lengths[index | 1])
+        self.assertEqual(128, frame_bitrates[index])
+        self.assertEqual(0, frame_lengths[0xfff9 >> 9 & 0xfff])
+
+    def test_frame_index_is_contiguous(self):
+        parser = Mp3Parser()
+        parser.parse(os.path.join(self.suite, 'Afrojack - Whatever.mp3'))
+        frames = parser.frames
+
+        self.assertEqual(parser.frames_count, len(frames))
+        self.assertEqual(4096, frames.offsets[0])
+        for i in range(1, len(frames)):
+            self.assertEqual(frames.offsets[i - 1] + frames.lengths[i - 1],
+                             frames.offsets[i])
+        self.assertEqual(os.path.getsize(os.path.join(
+            self.suite, 'Afrojack - Whatever.mp3')) - 128,
+            frames.offsets[-1] + frames.lengths[-1])
+
+    def test_id3v2_tag_length_is_syncsafe(self):
+        self.assertEqual(4086, int_from_syncsafe(b'\x00\x00\x1f\x76'))
+        self.assertEqual(2 ** 28 - 1, int_from_syncsafe(b'\x7f\x7f\x7f\x7f'))
+
+    def test_streaming_parse_reads_tags_at_ends(self):
+        directory = tempfile.mkdtemp()
+        filename = os.path.join(directory, 'frames.mp3')
+        frame = b'\xff\xfb\x90\x64' + bytes(413)
+        extended = b'TAG+' + b'Long title'.ljust(60, b'\x00') + bytes(163)
+        with open(filename, 'wb') as file:
+            file.write(b'ID3\x03\x00\x00\x00\x00\x00\x14' + bytes(20))
+            file.write(frame * 3 + b'\xff\xff' + frame)
+            file.write(extended + b'TAG' + b'Title'.ljust(125, b'\x00'))
+
+        try:
+            parser = Mp3Parser()
+            parser.parse(filename)
+            self.assertEqual([30, 447, 864, 1283],
+                             list(parser.frames.offsets))
+            self.assertEqual([(1281, 2)], parser.garbage)
+            self.assertEqual(3, parser.tag.version)
+            self.assertEqual(30, parser.tag.size)
+            self.assertEqual(b'Title', parser.byte_info['id3v1'][:5])
+            self.assertEqual(b'Long title', parser.byte_info['id3v1+'][:10])
+        finally:
+            shutil.rmtree(directory)
+
+    def write_vbr_file(self, directory, vbr_header):
+        filename = os.path.join(directory, 'vbr.mp3')
+        first = b'\xff\xfb\x90\x64' + bytes(32) + vbr_header
+        with open(filename, 'wb') as file:
+            file.write(first.ljust(417, b'\x00'))
+            file.write((b'\xff\xfb\x90\x64' + bytes(413)) * 2)
+            file.write(b'\xff\xfb\xa0\x64' + bytes(518))
+        return filename
+
+    def parse_bytes(self, data):
+        directory = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(directory, 'stream.mp3')
+            with open(filename, 'wb') as file:
+                file.write(data)
+            return parse(filename)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_resync_skips_false_syncs(self):
+        # MPEG-2 Layer 3, 64 Кб/с, 22050 Гц, с CRC: кадр 208 байт
+        frame = b'\xff\xf2\x80\x44' + bytes(204)
+        false_sync = b'\xff\xfb\x90\x64' + bytes(10)
+        data = false_sync + frame * 4 + b'\xff\xe0' + false_sync + frame * 3
+        mp3_data = self.parse_bytes(data)
+
+        self.assertEqual([14, 222, 430, 638, 862, 1070, 1278],
+                         list(mp3_data.frames.offsets))
+        self.assertEqual(((0, 14), (846, 16)), mp3_data.garbage)
+        self.assertEqual('MPEG-2', mp3_data.frame_info['Audio version ID'])
+
+    def test_single_sync_at_end_is_garbage(self):
+        frame = b'\xff\xfb\x90\x64' + bytes(413)
+        mp3_data = self.parse_bytes(bytes(100) + frame)
+        self.assertEqual(0, len(mp3_data.frames))
+        self.assertEqual(((0, 517),), mp3_data.garbage)
+
+        # тот же кадр в начале файла или продолжением потока - настоящий
+        self.assertEqual([0], list(self.parse_bytes(frame).frames.offsets))
+        mp3_data = self.parse_bytes(frame * 3 + bytes(100) + frame)
+        self.assertEqual([0, 417, 834, 1351], list(mp3_data.frames.offsets))
+
+    def test_sync_pattern_follows_header_tables(self):
+        self.assertIsNotNone(sync_pattern.match(b'\xff\xfb\x90\x64'))
+        self.assertIsNotNone(sync_pattern.match(b'\xff\xf2\x80\x44'))
+        for header in (b'\xff\xfb\xf0\x64', b'\xff\xfb\x9c\x64',
+                       b'\xff\xeb\x90\x64', b'\xff\xf9\x90\x64',
+                       b'\xff\xfb\x90\x66', b'\xff\xff\xff\xff'):
+            self.assertIsNone(sync_pattern.match(header))
+
+    def test_resync_after_long_ff_run(self):
+        frame = b'\xff\xfb\x90\x64' + bytes(413)
+        mp3_data = self.parse_bytes(b'\xff' * 200000 + frame * 3)
+        self.assertEqual([200000, 200417, 200834],
+                         list(mp3_data.frames.offsets))
+        self.assertEqual(((0, 200000),), mp3_data.garbage)
+
+    def test_false_syncs_everywhere(self):
+        mp3_data = self.parse_bytes(b'\xff\xfb\x90\x64' * 50000)
+        self.assertEqual(0, len(mp3_data.frames))
+        self.assertEqual(((0, 200000),), mp3_data.garbage)
+
+    def test_stream_info_from_xing_header(self):
+        directory = tempfile.mkdtemp()
+        try:
+            filename = self.write_vbr_file(
+                directory, b'Xing\x00\x00\x00\x03' +
+                (1000).to_bytes(4, 'big') + (160000).to_bytes(4, 'big'))
+            parser = Mp3Parser()
+            parser.parse(filename, index_frames=False)
+            stream_info = parser.get_stream_info()
+
+            self.assertEqual(1, len(parser.frames))
+            self.assertEqual(1000, stream_info['Frames'])
+            self.assertAlmostEqual(1000 * 1152 / 44100,
+                                   stream_info['Duration'])
+            self.assertTrue(stream_info['VBR'])
+        finally:
+            shutil.rmtree(directory)
+
+    def test_stream_info_from_frame_index(self):
+        directory = tempfile.mkdtemp()
+        try:
+            filename = self.write_vbr_file(directory, b'')
+            info = Mp3Info(filename)
+            self.assertEqual(4, info.stream_info['Frames'])
+            self.assertEqual(136, info.stream_info['Average bitrate'])
+            self.assertEqual('VBR', info.info['VBR Mode'])
+            self.assertEqual('0:00.104', info.info['Duration'])
+        finally:
+            shutil.rmtree(directory)
+
+    def test_stream_info_from_info_header(self):
+        info = Mp3Info(os.path.join(self.suite, 'Afrojack - Whatever.mp3'))
+        self.assertEqual(5727, info.stream_info['Frames'])
+        self.assertEqual('2:29.603', info.info['Duration'])
+        self.assertEqual('128 Kb/sec', info.info['Average Bitrate'])
+        self.assertEqual('CBR (Info header)', info.info['VBR Mode'])
+
+    def test_cbr_without_header_is_estimated(self):
+        directory = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(directory, 'cbr.mp3')
+            with open(filename, 'wb') as file:
+                file.write(b'ID3\x03\x00\x00\x00\x00\x00\x14' + bytes(20))
+                file.write((b'\xff\xfb\x90\x64' + bytes(413)) * 1000)
+            mp3_data = parse(filename, index_frames=False)
+
+            self.assertFalse(mp3_data.frames.complete)
+            self.assertEqual(CBR_PROBE_FRAMES, len(mp3_data.frames))
+            self.assertAlmostEqual(417000 * 8 / 128000,
+                                   mp3_data.stream_info['Duration'])
+            self.assertAlmostEqual(1000, mp3_data.stream_info['Frames'],
+                                   delta=3)
+            self.assertFalse(mp3_data.stream_info['VBR'])
+
+            # первая перемотка дочитывает индекс и идёт точно по кадрам
+            self.assertEqual(30 + 38 * 417, SeekTable(mp3_data).locate(1)[1])
+            self.assertTrue(mp3_data.frames.complete)
+            self.assertEqual(1000, len(mp3_data.frames))
+            self.assertEqual(30 + 999 * 417, mp3_data.frames.offsets[-1])
+        finally:
+            shutil.rmtree(directory)
+
+    def test_vbr_without_header_is_indexed(self):
+        directory = tempfile.mkdtemp()
+        try:
+            filename = self.write_vbr_file(directory, b'')
+            mp3_data = parse(filename, index_frames=False)
+            self.assertTrue(mp3_data.frames.complete)
+            self.assertEqual(4, len(mp3_data.frames))
+        finally:
+            shutil.rmtree(directory)
+
+    def test_seek_table_from_frame_index(self):
+        parser = Mp3Parser()
+        table = SeekTable(parser.parse(
+            os.path.join(self.suite, 'Afrojack - Whatever.mp3')))
+
+        self.assertEqual((0, parser.frames.offsets[1]), table.locate(0))
+        frame_time, offset = table.locate(60)
+        frame = int(60 * 44100 / 1152)
+        self.assertAlmostEqual(frame * 1152 / 44100, frame_time)
+        self.assertEqual(parser.frames.offsets[1 + frame], offset)
+        self.assertEqual(parser.frames.offsets[-1], table.locate(1000)[1])
+
+    def test_seek_table_loads_frame_index(self):
+        mp3_data = parse(os.path.join(self.suite, 'Afrojack - Whatever.mp3'),
+                         index_frames=False)
+        table = SeekTable(mp3_data)
+        self.assertFalse(mp3_data.frames.complete)
+
+        frame_time, offset = table.locate(60)
+        frame = int(60 * 44100 / 1152)
+        self.assertAlmostEqual(frame * 1152 / 44100, frame_time)
+        self.assertEqual(mp3_data.frames.offsets[1 + frame], offset)
+
+    def test_seek_table_from_xing_toc(self):
+        # файл пропал до первой перемотки: остаётся оглавление Xing
+        directory = tempfile.mkdtemp()
+        filename = os.path.join(directory, 'track.mp3')
+        shutil.copy(os.path.join(self.suite, 'Afrojack - Whatever.mp3'),
+                    filename)
+        table = SeekTable(parse(filename, index_frames=False))
+        shutil.rmtree(directory)
+
+        self.assertEqual(4096 + 417, table.locate(0)[1])
+        middle = table.locate(table.duration / 2)[1]
+        self.assertAlmostEqual(4096 + 2394069 / 2, middle, delta=20000)
+
+    def test_results_are_independent(self):
+        parser = Mp3Parser()
+        whatever = parser.parse(
+            os.path.join(self.suite, 'Afrojack - Whatever.mp3'))
+        directory = tempfile.mkdtemp()
+        try:
+            filename = os.path.join(directory, 'frames.mp3')
+            with open(filename, 'wb') as file:
+                file.write(b'\xff\xfb\xa0\x64' + bytes(518))
+            other = parser.parse(filename)
+        finally:
+            shutil.rmtree(directory)
+
+        self.assertEqual(128, whatever.frame_info['Bitrate index'])
+        self.assertEqual(160, other.frame_info['Bitrate index'])
+        self.assertEqual(5728, len(whatever.frames))
+        with self.assertRaises(TypeError):
+            whatever.frame_info['Bitrate index'] = 0
+
+    def test_parse_many_keeps_order(self):
+        filenames = [os.path.join(self.suite, 'Afrojack - Whatever.mp3'),
+                     os.path.join(self.suite, 'missing.mp3'),
+                     os.path.join(self.suite, 'notmp3.txt')] * 4
+        results = list(parse_many(filenames, workers=4))
+
+        self.assertEqual(filenames[0], results[0].filename)
+        self.assertEqual(5728, len(results[9].frames))
+        self.assertIsInstance(results[1], FileNotFoundError)
+        self.assertIsInstance(results[2], AttributeError)
+
     def test_info_filling(self):
         info = Mp3Info(os.path.join(self.suite, 'Afrojack - Whatever.mp3'))
         self.assertTrue(info.info)
@@ -119,16 +381,16 @@ class TestMp3Parsing(unittest.TestCase):
         info = Mp3Info(os.path.join(self.suite, filename))
 
         self.assertEqual('ID3v2.3', info.info["ID3v2 Version"])
-        self.assertEqual(b'\x00Whatever', info.info["TIT2"])
-        self.assertEqual(b'\x00Afrojack', info.info["TPE1"])
-        self.assertEqual(b'\x00www.NewJams.net', info.info["TALB"])
-        self.assertEqual(b'\x002013', info.info["TYER"])
-        self.assertEqual(b'\x00Electronic', info.info["TCON"])
-        self.assertEqual(b'\x00eng\x00www.NewJams.net - New Music Everyday!',
+        self.assertEqual('Whatever', info.info["TIT2"])
+        self.assertEqual('Afrojack', info.info["TPE1"])
+        self.assertEqual('www.NewJams.net', info.info["TALB"])
+        self.assertEqual('2013', info.info["TYER"])
+        self.assertEqual('Electronic', info.info["TCON"])
+        self.assertEqual('www.NewJams.net - New Music Everyday!',
                          info.info["COMM"])
-        self.assertEqual(b'\x00www.NewJams.net', info.info["TCOM"])
-        self.assertEqual(b'\x00\x00www.NewJams.net', info.info["WXXX"])
-        self.assertEqual(b'\x00eng\x00www.NewJams.net - New Music Everyday!',
+        self.assertEqual('www.NewJams.net', info.info["TCOM"])
+        self.assertEqual('www.NewJams.net', info.info["WXXX"])
+        self.assertEqual('www.NewJams.net - New Music Everyday!',
                          info.info["USLT"])
         self.assertEqual(b'\x00eng\x00www.NewJams.net - New Music Everyday!',
                          info.info["SYLT"])
@@ -138,11 +400,11 @@ class TestMp3Parsing(unittest.TestCase):
         info = Mp3Info(os.path.join(self.suite, filename))
 
         self.assertEqual("ID3v2.3", info.info['ID3v2 Version'])
-        self.assertEqual(b'\x006/9', info.info['TRCK'])
-        self.assertEqual(b'\x00Tomorrow Never Knows', info.info['TIT2'])
-        self.assertEqual(b'\x00', info.info['TPE2'])
+        self.assertEqual('6/9', info.info['TRCK'])
+        self.assertEqual('Tomorrow Never Knows', info.info['TIT2'])
+        self.assertNotIn('TPE2', info.info)
         self.assertEqual(
-            b'\x00Sucker Punch (Original Motion Picture Soundtrack)',
+            'Sucker Punch (Original Motion Picture Soundtrack)',
             info.info['TALB'])
 
     def test_parse_id3v23_tag_second_third(self):
@@ -150,8 +412,8 @@ class TestMp3Parsing(unittest.TestCase):
         info = Mp3Info(os.path.join(self.suite, filename))
 
         self.assertEqual('ID3v2.3', info.info['ID3v2 Version'])
-        self.assertEqual(b'\x00No Beef (Vocal Mix)', info.info['TIT2'])
-        self.assertEqual(b'\x00Afrojack feat. Steve Aoki & Miss Palmer',
+        self.assertEqual('No Beef (Vocal Mix)', info.info['TIT2'])
+        self.assertEqual('Afrojack feat. Steve Aoki & Miss Palmer',
                          info.info['TPE1'])
 
     def test_parse_id3v22_tag_second_first(self):
@@ -159,18 +421,299 @@ class TestMp3Parsing(unittest.TestCase):
         info = Mp3Info(os.path.join(self.suite, filename))
 
         self.assertEqual('ID3v2.2', info.info['ID3v2 Version'])
-        self.assertEqual(b'Afrojack\x00', info.info['TP1'])
-        self.assertEqual(b'Various Artists\x00', info.info['TP2'])
-        self.assertEqual(b'7/17\x00', info.info['TRK'])
-        self.assertEqual(b'1/1\x00', info.info['TPA'])
-        self.assertEqual(b'2013\x00', info.info['TYE'])
-        self.assertEqual(b'Dance\x00', info.info['TCO'])
-        self.assertEqual(b'1\x00', info.info['TCP'])
-        self.assertEqual(b'iTunes 11.0.1\x00', info.info['TEN'])
-        self.assertEqual(b'edm people\x00', info.info['TAL'])
-        self.assertEqual(b'Air Guitar (Ultra Music Festival Anthem)\x00',
+        self.assertEqual('Afrojack', info.info['TP1'])
+        self.assertEqual('Various Artists', info.info['TP2'])
+        self.assertEqual('7/17', info.info['TRK'])
+        self.assertEqual('1/1', info.info['TPA'])
+        self.assertEqual('2013', info.info['TYE'])
+        self.assertEqual('Dance', info.info['TCO'])
+        self.assertEqual('1', info.info['TCP'])
+        self.assertEqual('iTunes 11.0.1', info.info['TEN'])
+        self.assertEqual('edm people', info.info['TAL'])
+        self.assertEqual('Air Guitar (Ultra Music Festival Anthem)',
                          info.info['TT2'])
 
 
+class TestId3Tag(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'tag.mp3')
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def read_tag(self, version, frames, flags=0):
+        size = len(frames)
+        syncsafe = bytes((size >> shift) & 0x7f for shift in (21, 14, 7, 0))
+        with open(self.filename, 'wb') as file:
+            file.write(b'ID3' + bytes((version, 0, flags)) + syncsafe)
+            file.write(frames)
+        tag = Id3Tag(self.filename)
+        with open(self.filename, 'rb') as file:
+            self.assertEqual(10 + size, tag.read(file))
+        return tag
+
+    @staticmethod
+    def make_frame(frame_id, data, flags=0):
+        size = bytes((len(data) >> shift) & 0x7f for shift in (21, 14, 7, 0))
+        return frame_id + size + flags.to_bytes(2, 'big') + data
+
+    def test_text_encodings(self):
+        title = 'Пи'.encode('utf-8')
+        tag = self.read_tag(4, self.make_frame(b'TIT2', b'\x03' + title)
+                            + self.make_frame(b'TPE1', b'\x00A\x00B')
+                            + self.make_frame(b'TXXX', b'\x01' +
+                                              'key\x00value'.encode('utf-16'))
+                            + bytes(16))
+        self.assertEqual('Пи', tag.frames['TIT2'])
+        self.assertEqual('A/B', tag.frames['TPE1'])
+        self.assertEqual('key: value', tag.frames['TXXX'])
+
+    def test_unsynchronised_frame(self):
+        tag = self.read_tag(4, self.make_frame(b'TIT2', b'\x00\xff\x00\xe0',
+                                               flags=0x02))
+        self.assertEqual('\xff\xe0', tag.frames['TIT2'])
+
+    def test_picture_is_a_lazy_reference(self):
+        image = b'\x89PNG' + bytes(5000)
+        frame = self.make_frame(b'APIC', b'\x00image/png\x00\x03cover\x00' +
+                                image)
+        tag = self.read_tag(4, self.make_frame(b'TIT2', b'\x00Song') + frame)
+
+        picture = tag.pictures[0]
+        self.assertEqual(('image/png', 3, 'cover'), (
+            picture.mime, picture.picture_type, picture.description))
+        self.assertIsNone(picture.data)
+        self.assertEqual(len(image), picture.length)
+        self.assertEqual(image, picture.read())
+        self.assertNotIn('APIC', tag.frames)
+
+    def test_frame_shorter_than_prefix_is_skipped(self):
+        # флаг 0x0001: перед данными 4 байта длины, а в кадре всего 2 байта
+        tag = self.read_tag(4, self.make_frame(b'APIC', b'\x00\x00', 0x0001)
+                            + self.make_frame(b'TPE1', b'\x00', 0x0001)
+                            + self.make_frame(b'TIT2', b'\x00Song'))
+        self.assertEqual([], tag.pictures)
+        self.assertEqual(['TIT2'], list(tag.frames))
+
+    def test_footer_only_in_version_2_4(self):
+        frames = self.make_frame(b'TIT2', b'\x00Song')
+        for version, size in ((3, 10 + len(frames)), (4, 20 + len(frames))):
+            with open(self.filename, 'wb') as file:
+                file.write(b'ID3' + bytes((version, 0, 0x10, 0, 0, 0,
+                                           len(frames))) + frames)
+            tag = Id3Tag(self.filename)
+            with open(self.filename, 'rb') as file:
+                self.assertEqual(size, tag.read(file))
+            self.assertEqual('Song', tag.frames['TIT2'])
+
+    def test_version_2_2_frames(self):
+        frames = b'TT2\x00\x00\x05\x00Song' + \
+            b'PIC\x00\x00\x0a\x00JPG\x00\x00\xff\xd8\xff\xe0'
+        tag = self.read_tag(2, frames)
+        self.assertEqual('Song', tag.frames['TT2'])
+        self.assertEqual('image/jpg', tag.pictures[0].mime)
+        self.assertEqual(b'\xff\xd8\xff\xe0', tag.pictures[0].read())
+
+    def write_audio_tag(self, version, frames, padding):
+        # тег с заполнением, за которым идут "аудиоданные"
+        audio = bytes(range(256)) * 8
+        self.read_tag(version, frames + bytes(padding))
+        with open(self.filename, 'ab') as file:
+            file.write(audio)
+        return audio
+
+    def read_written_tag(self):
+        tag = Id3Tag(self.filename)
+        with open(self.filename, 'rb') as file:
+            size = tag.read(file)
+            file.seek(size)
+            return tag, file.read()
+
+    def test_write_in_place_keeps_other_frames(self):
+        image = b'\x89PNG' + bytes(500)
+        frames = self.make_frame(b'TIT2', b'\x00Old title') + \
+            self.make_frame(b'APIC', b'\x00image/png\x00\x03\x00' + image) + \
+            self.make_frame(b'TALB', b'\x00Album')
+        audio = self.write_audio_tag(4, frames, 200)
+        file_size = os.path.getsize(self.filename)
+
+        self.assertTrue(write_tag(self.filename, {'TIT2': 'Новое название',
+                                                  'TPE1': 'Artist',
+                                                  'TALB': None}))
+        self.assertEqual(file_size, os.path.getsize(self.filename))
+        tag, rest = self.read_written_tag()
+        self.assertEqual(['TIT2', 'TPE1'], list(tag.frames))
+        self.assertEqual('Новое название', tag.frames['TIT2'])
+        self.assertEqual(image, tag.pictures[0].read())
+        self.assertEqual(audio, rest)
+
+    def test_write_grows_tag_with_padding(self):
+        audio = self.write_audio_tag(
+            3, self.make_frame(b'TIT2', b'\x00Title'), 0)
+
+        self.assertFalse(write_tag(self.filename, {'TPE1': 'Артист'}))
+        tag, rest = self.read_written_tag()
+        self.assertEqual(audio, rest)
+        self.assertEqual(0, tag.size % TAG_PADDING)
+        self.assertEqual('Артист', tag.frames['TPE1'])
+        self.assertEqual('Title', tag.frames['TIT2'])
+
+        self.assertTrue(write_tag(self.filename, {'TALB': 'A' * 1000}))
+        self.assertEqual(audio, self.read_written_tag()[1])
+
+    def test_write_creates_tag(self):
+        audio = bytes(range(256))
+        with open(self.filename, 'wb') as file:
+            file.write(audio)
+
+        self.assertFalse(write_tag(self.filename, {'TIT2': 'Song'}))
+        tag, rest = self.read_written_tag()
+        self.assertEqual((3, 'Song'), (tag.version, tag.frames['TIT2']))
+        self.assertEqual(audio, rest)
+
+    def test_write_only_text_frames(self):
+        self.read_tag(4, bytes(100))
+        with self.assertRaises(AttributeError):
+            write_tag(self.filename, {'APIC': 'picture'})
+
+
+class TestLibrary(unittest.TestCase):
+    suite = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'suite')
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.music = os.path.join(self.directory, 'music')
+        os.mkdir(self.music)
+        for name in ('a.mp3', 'b.mp3'):
+            shutil.copy(os.path.join(self.suite, 'Afrojack - Whatever.mp3'),
+                        os.path.join(self.music, name))
+        self.library = Library(os.path.join(self.directory, 'library.db'))
+
+    def tearDown(self):
+        self.library.close()
+        shutil.rmtree(self.directory)
+
+    def test_read_track(self):
+        row = read_track(os.path.join(self.music, 'a.mp3'))
+        self.assertEqual('Whatever', row['Title'])
+        self.assertEqual('Afrojack', row['Artist'])
+        self.assertEqual(149.603, row['Duration'])
+        self.assertEqual(128, row['Bitrate'])
+        self.assertIsNone(row['Error'])
+
+    def test_read_track_keeps_any_error(self):
+        with mock.patch('library.Mp3Info', side_effect=ValueError('broken')):
+            row = read_track(os.path.join(self.music, 'a.mp3'))
+        self.assertEqual('broken', row['Error'])
+        self.assertIsNotNone(row['Size'])
+
+    def test_update_reparses_only_changed_files(self):
+        self.assertEqual((2, 0), self.library.update([self.music], 2))
+        self.assertEqual((0, 0), self.library.update([self.music], 2))
+
+        with open(os.path.join(self.music, 'a.mp3'), 'ab') as file:
+            file.write(b'\x00')
+        os.remove(os.path.join(self.music, 'b.mp3'))
+        self.assertEqual((1, 1), self.library.update([self.music], 2))
+
+        tracks = list(self.library.tracks())
+        self.assertEqual(1, len(tracks))
+        self.assertEqual('Whatever', tracks[0]['Title'])
+
+    def test_write_tags_in_bulk(self):
+        # тег без единого кадра звука тоже переписывается
+        with open(os.path.join(self.music, 'c.mp3'), 'wb') as file:
+            file.write(b'ID3\x03\x00\x00\x00\x00\x01\x00' + bytes(128))
+
+        results = dict(write_tags([self.music], {'TPE1': 'Someone'}))
+        self.assertEqual(3, len(results))
+        self.assertTrue(all(result is True for result in results.values()))
+        self.assertEqual('Someone', read_track(
+            os.path.join(self.music, 'b.mp3'))['Artist'])
+
+        results = dict(write_tags([self.music], {'APIC': 'cover'}))
+        self.assertTrue(all(isinstance(result, AttributeError)
+                            for result in results.values()))
+
+
+class TestTimeline(unittest.TestCase):
+    suite = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'suite')
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'track.mp3')
+        shutil.copy(os.path.join(self.suite, 'Afrojack - Whatever.mp3'),
+                    self.filename)
+
+    def tearDown(self):
+        shutil.rmtree(self.directory)
+
+    def test_global_gain_from_side_info(self):
+        # MPEG-1 stereo: 20 бит до первой гранулы, global_gain - через
+        # 21 бит от начала блока в 59 бит
+        gains = (100, 120, 140, 160)
+        bits = 0
+        for block, gain in enumerate(gains):
+            bits |= gain << (256 - (20 + block * 59 + 29))
+        frame = b'\xff\xfb\x90\x64' + bits.to_bytes(32, 'big')
+        self.assertEqual(130, get_global_gain(frame))
+        self.assertEqual(0, get_global_gain(b'\xff\xfd\x90\x64' + bytes(32)))
+
+    def test_timeline_is_cached_next_to_track(self):
+        timeline = get_timeline(self.filename)
+        self.assertEqual(151, len(timeline))
+        self.assertEqual(128, timeline.bitrates[0])
+        self.assertEqual(417, timeline.sizes[0])
+        self.assertTrue(all(100 < gain < 256 for gain in timeline.gains))
+
+        stat = os.stat(self.filename)
+        key = stat.st_size, stat.st_mtime_ns
+        cached = Timeline.load(self.filename + '.timeline', key, 1.0)
+        self.assertEqual(timeline.gains, cached.gains)
+        self.assertEqual(timeline.bitrates, cached.bitrates)
+        self.assertIsNone(Timeline.load(self.filename + '.timeline',
+                                        (key[0] + 1, key[1]), 1.0))
+        self.assertIsNone(Timeline.load(self.filename + '.timeline',
+                                        key, 2.0))
+
+
+@unittest.skipIf(HexModel is None, 'PyQt5 is not installed')
+class TestHexModel(unittest.TestCase):
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.filename = os.path.join(self.directory, 'bytes.mp3')
+        self.model = HexModel()
+
+    def tearDown(self):
+        self.model.close()
+        shutil.rmtree(self.directory)
+
+    def set_bytes(self, data):
+        with open(self.filename, 'wb') as file:
+            file.write(data)
+        self.model.set_file(self.filename)
+
+    def test_rows_and_cells(self):
+        self.set_bytes(bytes(range(40)))
+        self.assertEqual(3, self.model.rowCount())
+        self.assertEqual(16, self.model.columnCount())
+        self.assertEqual('00', self.model.data(self.model.index(0, 0)))
+        self.assertEqual('1f', self.model.data(self.model.index(1, 15)))
+        self.assertEqual(33, self.model.get_offset(self.model.index(2, 1)))
+
+    def test_last_partial_row(self):
+        self.set_bytes(b'\xff' * 18)
+        self.assertEqual(2, self.model.rowCount())
+        self.assertEqual('ff', self.model.data(self.model.index(1, 1)))
+        self.assertIsNone(self.model.data(self.model.index(1, 2)))
+
+    def test_headers_and_empty_file(self):
+        self.set_bytes(b'')
+        self.assertEqual(0, self.model.rowCount())
+        self.assertEqual('a', self.model.headerData(10, Qt.Horizontal))
+        self.assertEqual('00000020', self.model.headerData(2, Qt.Vertical))
+
+
 if __name__ == '__main__':
     unittest.main()
@@ -0,0 +1,144 @@
+import os
+import sys
+from mmap import mmap, ACCESS_READ
+from array import array
+from struct import Struct
+from mp3 import parse
+
+# размер заголовка кадра и side info с запасом на CRC
+SIDE_INFO_END = 4 + 2 + 32
+
+
+def get_global_gain(frame):
+    # среднее global_gain по гранулам и каналам из side info Layer 3 -
+    # грубая оценка громкости кадра без декодирования звука
+    header = int.from_bytes(frame[:4], byteorder='big')
+    if header >> 17 & 3 != 1:
+        return 0
+    channels = 1 if header >> 6 & 3 == 3 else 2
+    start = 4 if header >> 16 & 1 else 6  # после заголовка может быть CRC
+
+    if header >> 19 & 3 == 3:  # MPEG-1: две гранулы, есть scfsi
+        position = 9 + (5 if channels == 1 else 3) + 4 * channels
+        blocks, block_bits = 2 * channels, 59
+    else:  # MPEG-2 и 2.5: одна гранула
+        position = 8 + channels
+        blocks, block_bits = channels, 63
+
+    side_info = frame[start:]
+    bits = int.from_bytes(side_info, byteorder='big')
+    total_bits = len(side_info) * 8
+    gains = []
+    for block in range(blocks):
+        gain_end = position + block * block_bits + 21 + 8
+        if gain_end > total_bits:
+            break
+        gains.append(bits >> (total_bits - gain_end) & 0xff)
+    return sum(gains) // len(gains) if gains else 0
+
+
+class Timeline:
+    # Средние битрейт (Кб/с), размер кадра и global_gain по отрезкам
+    # времени одинаковой длины. Сохраняется рядом с треком и используется
+    # повторно, пока у трека не изменились размер и время изменения
+    signature = b'MP3T'
+    header = Struct('>4sdQQI')  # подпись, длина отрезка, размер, mtime, число
+
+    def __init__(self, bucket_duration, bitrates=None, sizes=None,
+                 gains=None):
+        self.bucket_duration = bucket_duration
+        self.bitrates = bitrates if bitrates is not None else array('H')
+        self.sizes = sizes if sizes is not None else array('H')
+        self.gains = gains if gains is not None else array('B')
+
+    def __len__(self):
+        return len(self.bitrates)
+
+    @classmethod
+    def from_data(cls, mp3_data, bucket_duration=1.0):
+        timeline = cls(bucket_duration)
+        frames = mp3_data.frames
+        frames.load()
+        first = 1 if mp3_data.vbr_info.get('Type') else 0
+        stream_info = mp3_data.stream_info
+        if len(frames) <= first or not stream_info.get('Frames'):
+            return timeline
+
+        frame_duration = stream_info['Duration'] / stream_info['Frames']
+        per_bucket = max(1, round(bucket_duration / frame_duration))
+        with open(mp3_data.filename, 'rb') as file:
+            mapping = mmap(file.fileno(), 0, access=ACCESS_READ)
+        try:
+            for start in range(first, len(frames), per_bucket):
+                stop = min(start + per_bucket, len(frames))
+                count = stop - start
+                gain = 0
+                for index in range(start, stop):
+                    offset = frames.offsets[index]
+                    gain += get_global_gain(
+                        mapping[offset:offset + SIDE_INFO_END])
+                timeline.bitrates.append(
+                    sum(frames.bitrates[start:stop]) // count)
+                timeline.sizes.append(sum(frames.lengths[start:stop]) // count)
+                timeline.gains.append(gain // count)
+        finally:
+            mapping.close()
+        return timeline
+
+    def save(self, path, key):
+        with open(path, 'wb') as file:
+            file.write(self.header.pack(self.signature, self.bucket_duration,
+                                        key[0], key[1], len(self)))
+            for values in (self.bitrates, self.sizes, self.gains):
+                get_little_endian(values).tofile(file)
+
+    @classmethod
+    def load(cls, path, key, bucket_duration):
+        # None, если кэша нет или он от другой версии трека
+        try:
+            with open(path, 'rb') as file:
+                header = file.read(cls.header.size)
+                if len(header) != cls.header.size:
+                    return None
+                signature, duration, size, mtime, count = \
+                    cls.header.unpack(header)
+                if signature != cls.signature or (size, mtime) != key or \
+                        duration != bucket_duration:
+                    return None
+
+                timeline = cls(duration)
+                for values in (timeline.bitrates, timeline.sizes,
+                               timeline.gains):
+                    values.fromfile(file, count)
+                    if sys.byteorder == 'big':
+                        values.byteswap()
+        except (OSError, EOFError):
+            return None
+        return timeline
+
+
+def get_little_endian(values):
+    if sys.byteorder == 'big':
+        values = array(values.typecode, values)
+        values.byteswap()
+    return values
+
+
+def get_timeline(filename, bucket_duration=1.0, mp3_data=None):
+    # из кэша <трек>.timeline или одним проходом по индексу кадров;
+    # mp3_data - уже готовый разбор, если он есть
+    stat = os.stat(filename)
+    key = stat.st_size, stat.st_mtime_ns
+    path = filename + '.timeline'
+    timeline = Timeline.load(path, key, bucket_duration)
+    if timeline is not None:
+        return timeline
+
+    if mp3_data is None:
+        mp3_data = parse(filename, index_frames=False)
+    timeline = Timeline.from_data(mp3_data, bucket_duration)
+    try:
+        timeline.save(path, key)
+    except OSError:
+        pass  # каталог только для чтения: обойдёмся без кэша
+    return timeline
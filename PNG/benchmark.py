@@ -0,0 +1,127 @@
+import os
+import argparse
+from math import floor
+from timeit import default_timer
+
+from png import decode
+from filters import Unfilter
+
+
+def legacy_unfilter(filter_type, prev_line, line, bpp):
+    # построчное снятие фильтров в том виде, в каком оно было
+    # в ImageWindow до появления filters.Unfilter
+    pixline = b''
+    for i in range(len(line)):
+        left_byte = 0 if i - bpp < 0 else pixline[i - bpp]
+        upper_byte = prev_line[i] if prev_line is not None else 0
+        upper_left_byte = 0 if i - bpp < 0 or prev_line is None \
+            else prev_line[i - bpp]
+        byte = line[i]
+
+        if filter_type == 0:
+            real_byte = byte
+        elif filter_type == 1:
+            real_byte = (byte + left_byte) % 256
+        elif filter_type == 2:
+            real_byte = (byte + upper_byte) % 256
+        elif filter_type == 3:
+            real_byte = int((byte + floor(left_byte + upper_byte)/2) % 256)
+        else:
+            real_byte = (byte + legacy_paeth_predictor(
+                left_byte, upper_byte, upper_left_byte)) % 256
+        pixline += real_byte.to_bytes(1, byteorder='big')
+    return pixline
+
+
+def legacy_paeth_predictor(left, above, upper_left):
+    p = left + above - upper_left
+    p_left = abs(p - left)
+    p_above = abs(p - above)
+    p_upper_left = abs(p - upper_left)
+
+    if p_left <= p_above and p_left <= p_upper_left:
+        return left
+    if p_above <= p_upper_left:
+        return above
+    return upper_left
+
+
+def make_scanlines(filter_type, width, bpp, rows):
+    row_len = width * bpp
+    return [bytes([filter_type]) + os.urandom(row_len) for _ in range(rows)]
+
+
+def run_legacy(scanlines, bpp):
+    prev_line = None
+    for scanline in scanlines:
+        prev_line = legacy_unfilter(scanline[0], prev_line, scanline[1:], bpp)
+
+
+def run_unfilter(scanlines, bpp):
+    unfilter = Unfilter(len(scanlines[0]) - 1, bpp)
+    for scanline in scanlines:
+        unfilter.unfilter(scanline)
+
+
+def measure(function, *args):
+    start = default_timer()
+    function(*args)
+    return default_timer() - start
+
+
+def benchmark_filters(width, bpp, rows):
+    names = {0: 'None', 1: 'Sub', 2: 'Up', 3: 'Average', 4: 'Paeth'}
+    print('Unfiltering {} rows of {} pixels, {} bytes per pixel'.format(
+        rows, width, bpp))
+
+    for filter_type, name in names.items():
+        scanlines = make_scanlines(filter_type, width, bpp, rows)
+        legacy = measure(run_legacy, scanlines, bpp)
+        current = measure(run_unfilter, scanlines, bpp)
+        print(' {:8} legacy: {:8.3f} s  unfilter: {:8.4f} s  x{:.1f}'.format(
+            name, legacy, current, legacy / current))
+
+
+def benchmark_decode(file_names):
+    total_pixels = total_time = 0
+    for file_name in file_names:
+        try:
+            start = default_timer()
+            height, width = decode(file_name).shape[:2]
+            seconds = default_timer() - start
+        except AttributeError as e:
+            print(' {}: {}'.format(file_name, e.args[0]))
+            continue
+
+        total_pixels += width * height
+        total_time += seconds
+        print(' {}: {}x{} in {:.4f} s'.format(file_name, width, height,
+                                              seconds))
+
+    if total_time:
+        print('Decoded {:.2f} Mpixels/s'.format(
+            total_pixels / total_time / 1e6))
+
+
+def try_start_console_mode():
+    info = 'PNG decoding benchmark'
+    parser = argparse.ArgumentParser(description=info)
+
+    parser.add_argument('-w', '--width', type=int, default=1024,
+                        help='image width in pixels')
+    parser.add_argument('-b', '--bpp', type=int, default=4,
+                        help='bytes per pixel')
+    parser.add_argument('-r', '--rows', type=int, default=32,
+                        help='rows per filter type')
+    parser.add_argument('-d', '--decode', type=str, nargs='+',
+                        help='time decoding of png files instead')
+
+    return parser.parse_args()
+
+
+if __name__ == '__main__':
+    args = try_start_console_mode()
+    if args.decode:
+        benchmark_decode(args.decode)
+    else:
+        benchmark_filters(args.width, args.bpp, args.rows)
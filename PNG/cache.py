@@ -0,0 +1,125 @@
+import os
+import json
+import sqlite3
+from threading import Lock
+from collections import OrderedDict
+from png import PngInfo
+
+default_path = os.path.join(os.path.expanduser('~'), '.png_info.sqlite')
+default_budget = 256 * 2 ** 20
+
+
+class InfoCache:
+    # Разобранные сведения о файлах, ключ - (путь, размер, время изменения).
+    # Запись с другими размером или временем считается устаревшей.
+
+    def __init__(self, path=default_path):
+        try:
+            self.connection = sqlite3.connect(path)
+            self.create_table()
+        except sqlite3.Error:
+            self.connection = sqlite3.connect(':memory:')
+            self.create_table()
+
+    def create_table(self):
+        self.connection.execute(
+            'CREATE TABLE IF NOT EXISTS entries ('
+            'path TEXT, kind TEXT, size INTEGER, mtime INTEGER, data TEXT, '
+            'PRIMARY KEY (path, kind))')
+
+    @staticmethod
+    def get_key(file_name):
+        stat = os.stat(file_name)
+        return os.path.abspath(file_name), stat.st_size, stat.st_mtime_ns
+
+    def get(self, file_name, kind='info'):
+        try:
+            path, size, mtime = self.get_key(file_name)
+        except OSError:
+            return None
+
+        entry = self.connection.execute(
+            'SELECT data FROM entries '
+            'WHERE path = ? AND kind = ? AND size = ? AND mtime = ?',
+            (path, kind, size, mtime)).fetchone()
+        if entry is None:
+            return None
+        return json.loads(entry[0], object_pairs_hook=OrderedDict)
+
+    def put(self, file_name, data, kind='info'):
+        self.put_many([(file_name, data)], kind)
+
+    def put_many(self, items, kind='info'):
+        # пары (файл, сведения) одной транзакцией
+        entries = []
+        for file_name, data in items:
+            try:
+                path, size, mtime = self.get_key(file_name)
+            except OSError:
+                continue
+            entries.append((path, kind, size, mtime, json.dumps(data)))
+
+        self.connection.executemany(
+            'INSERT OR REPLACE INTO entries VALUES (?, ?, ?, ?, ?)', entries)
+        self.connection.commit()
+
+    def get_info(self, file_name):
+        info = self.get(file_name)
+        if info is not None:
+            return PngInfo(file_name, info=info)
+
+        png_info = PngInfo(file_name)
+        self.put(file_name, png_info.info)
+        return png_info
+
+    def close(self):
+        self.connection.close()
+
+
+class ImageCache:
+    # Декодированные изображения (массивы ARGB32) в порядке последнего
+    # обращения. При превышении бюджета в байтах вытесняются самые старые.
+    # Заполняется из потока предзагрузки, поэтому доступ - под замком.
+
+    def __init__(self, budget=default_budget):
+        self.budget = budget
+        self.size = 0
+        self.images = OrderedDict()
+        self.lock = Lock()
+
+    def get(self, file_name):
+        try:
+            key = InfoCache.get_key(file_name)
+        except OSError:
+            return None
+
+        with self.lock:
+            pixels = self.images.get(key)
+            if pixels is not None:
+                self.images.move_to_end(key)
+            return pixels
+
+    def put(self, file_name, pixels):
+        try:
+            key = InfoCache.get_key(file_name)
+        except OSError:
+            return
+        if pixels.nbytes > self.budget:
+            return
+
+        with self.lock:
+            if key in self.images:
+                self.size -= self.images.pop(key).nbytes
+            self.images[key] = pixels
+            self.size += pixels.nbytes
+            while self.size > self.budget:
+                _, evicted = self.images.popitem(last=False)
+                self.size -= evicted.nbytes
+
+    def __contains__(self, file_name):
+        try:
+            key = InfoCache.get_key(file_name)
+        except OSError:
+            return False
+        with self.lock:
+            return key in self.images
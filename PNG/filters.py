@@ -0,0 +1,88 @@
+import numpy as np
+
+
+class Unfilter:
+    # Снимает фильтры PNG со строк изображения целиком. Строки пишутся
+    # в два заранее выделенных буфера: текущий и предыдущий.
+
+    def __init__(self, row_len, bpp):
+        self.row_len = row_len
+        self.bpp = bpp
+        self.current = bytearray(row_len)
+        self.previous = bytearray(row_len)  # нулевая строка над первой
+        self.first_row = True
+        self.filter_method = {0: self.none,
+                              1: self.sub,
+                              2: self.up,
+                              3: self.average,
+                              4: self.paeth}
+
+    def unfilter(self, scanline):
+        filter_type = scanline[0]  # First byte is filter id
+        if filter_type not in self.filter_method.keys():
+            raise AttributeError('Incorrect filter type: {}'.format(
+                filter_type))
+
+        line = memoryview(scanline)[1:]
+        if len(line) != self.row_len:
+            line = bytes(line[:self.row_len]).ljust(self.row_len, b'\x00')
+
+        self.current, self.previous = self.previous, self.current
+        self.filter_method[filter_type](line)
+        self.first_row = False
+        return self.current
+
+    def unfilter_all(self, scanlines):
+        for scanline in scanlines:
+            yield self.unfilter(scanline)
+
+    def none(self, line):
+        self.current[:] = line
+
+    def sub(self, line):
+        bpp = self.bpp
+        out = np.frombuffer(self.current, np.uint8).reshape(-1, bpp)
+        source = np.frombuffer(line, np.uint8).reshape(-1, bpp)
+        np.cumsum(source, axis=0, dtype=np.uint8, out=out)
+
+    def up(self, line):
+        out = np.frombuffer(self.current, np.uint8)
+        np.add(np.frombuffer(line, np.uint8),
+               np.frombuffer(self.previous, np.uint8), out=out)
+
+    def average(self, line):
+        bpp = self.bpp
+        for lane in range(bpp):
+            left = 0
+            result = bytearray()
+            for byte, upper in zip(line[lane::bpp], self.previous[lane::bpp]):
+                left = (byte + ((left + upper) >> 1)) & 0xff
+                result.append(left)
+            self.current[lane::bpp] = result
+
+    def paeth(self, line):
+        if self.first_row:
+            # над первой строкой нули, и предсказатель Paeth равен Sub
+            self.sub(line)
+            return
+
+        bpp = self.bpp
+        for lane in range(bpp):
+            left = upper_left = 0
+            result = bytearray()
+            for byte, upper in zip(line[lane::bpp], self.previous[lane::bpp]):
+                p_left = abs(upper - upper_left)
+                p_upper = abs(left - upper_left)
+                p_upper_left = abs(left + upper - 2 * upper_left)
+
+                if p_left <= p_upper and p_left <= p_upper_left:
+                    predictor = left
+                elif p_upper <= p_upper_left:
+                    predictor = upper
+                else:
+                    predictor = upper_left
+
+                left = (byte + predictor) & 0xff
+                upper_left = upper
+                result.append(left)
+            self.current[lane::bpp] = result
@@ -1,14 +1,16 @@
 import os
-from math import floor
-from time import sleep
-from png import PngInfo, int_from_bytes
-from zlib import decompress
-
-from PyQt5.QtCore import Qt, QThread, pyqtSignal
-from PyQt5.QtGui import QPixmap, QIcon, QPalette, QImage, QColor, QRgba64
+import numpy as np
+from mmap import mmap, ACCESS_READ
+from png import PngDecoder, ChunkIndex
+from cache import InfoCache, ImageCache
+from pixels import pack_argb32
+
+from PyQt5.QtCore import Qt, QThread, pyqtSignal, QAbstractTableModel, \
+    QModelIndex
+from PyQt5.QtGui import QPixmap, QIcon, QPalette, QImage
 from PyQt5.QtWidgets import QMessageBox, QMainWindow, QScrollArea, QAction, \
     QLabel, QFileDialog, QVBoxLayout, QHBoxLayout, QWidget, QListWidget, \
-    QPushButton, QTableWidget, QTableWidgetItem, QAbstractItemView
+    QPushButton, QTableView, QHeaderView, QAbstractItemView
 
 
 class MainWindow(QMainWindow):
@@ -37,7 +39,12 @@ class MainWindow(QMainWindow):
                                      QMessageBox.Yes | QMessageBox.No,
                                      QMessageBox.No)
 
-        event.accept() if reply == QMessageBox.Yes else event.ignore()
+        if reply == QMessageBox.Yes:
+            self.main_widget.image_window.stop_filling()
+            self.main_widget.stop_prefetching()
+            event.accept()
+        else:
+            event.ignore()
 
 
 class MainWidget(QWidget):
@@ -46,6 +53,9 @@ class MainWidget(QWidget):
         self.main_window = main_window
         self.current_file = os.path.abspath(file_name) if \
             file_name is not None else None
+        self.info_cache = InfoCache()
+        self.image_cache = ImageCache()
+        self.prefetcher = None
         self.image_info_window = ImageInfoWindow(self)
         self.image_window = ImageWindow(self)
         self.current_file_screen = CurrentFileScreen(self)
@@ -90,21 +100,33 @@ class MainWidget(QWidget):
         self.current_file_screen.update()
         self.image_info_window.image_info_list.clear()
 
-        if self.image_window.filler is not None and \
-                self.image_window.filler.isRunning():
-            self.image_window.filler.terminate()
+        self.image_window.stop_filling()
+        self.stop_prefetching()
 
         self.image_window.image = QImage()
         self.image_window.image_label.clear()
 
         try:
             self.image_info_window.update()
-            # self.hex_table.create_table()
+            self.hex_table.create_table()
             self.image_window.draw_image(self.current_file)
         except AttributeError as e:
             self.image_info_window.image_info_list.addItem(e.args[0])
             self.image_window.image_label.setPixmap(QPixmap())
 
+        self.start_prefetching()
+
+    def start_prefetching(self):
+        # соседние файлы декодируются заранее, пока смотрят текущий
+        file_names = self.file_switcher.get_neighbour_png_files()
+        self.prefetcher = Prefetcher(file_names, self.image_cache)
+        self.prefetcher.start(QThread.LowPriority)
+
+    def stop_prefetching(self):
+        if self.prefetcher is not None:
+            self.prefetcher.stopped = True
+            self.prefetcher.wait()
+
     def get_image_info(self):
         return self.image_info_window.image_info
 
@@ -118,13 +140,57 @@ class ByteInfoScreen(QLabel):
         self.setText(text)
 
 
-class TableFiller(QThread):
-    def __init__(self, fill_table):
-        super().__init__()
-        self.fill_table = fill_table
+class HexModel(QAbstractTableModel):
+    # Байты файла по 16 в строке. Файл отображается в память, а текст
+    # ячеек форматируется только для тех строк, которые видны в таблице.
+    columns = 16
 
-    def run(self):
-        self.fill_table()
+    def __init__(self):
+        super().__init__()
+        self.file = None
+        self.mapping = b''
+
+    def set_file(self, file_name):
+        self.beginResetModel()
+        self.close()
+        self.file = open(file_name, 'rb')
+        if os.fstat(self.file.fileno()).st_size:
+            self.mapping = mmap(self.file.fileno(), 0, access=ACCESS_READ)
+        self.endResetModel()
+
+    def close(self):
+        if self.mapping:
+            self.mapping.close()
+        if self.file is not None:
+            self.file.close()
+        self.file = None
+        self.mapping = b''
+
+    def get_offset(self, index):
+        return index.row() * self.columns + index.column()
+
+    def rowCount(self, parent=QModelIndex()):
+        return (len(self.mapping) + self.columns - 1) // self.columns
+
+    def columnCount(self, parent=QModelIndex()):
+        return self.columns
+
+    def data(self, index, role=Qt.DisplayRole):
+        if role == Qt.TextAlignmentRole:
+            return Qt.AlignCenter
+        if role != Qt.DisplayRole or not index.isValid():
+            return None
+        offset = self.get_offset(index)
+        if offset >= len(self.mapping):
+            return None
+        return '{:02x}'.format(self.mapping[offset])
+
+    def headerData(self, section, orientation, role=Qt.DisplayRole):
+        if role != Qt.DisplayRole:
+            return None
+        if orientation == Qt.Horizontal:
+            return '{:x}'.format(section)
+        return '{:08x}'.format(section * self.columns)
 
 
 class HexTable(QScrollArea):
@@ -132,33 +198,78 @@ class HexTable(QScrollArea):
         super().__init__(main_window)
         self.main_window = main_window
         self.image_info = None
-        self.table = QTableWidget()
+        self.chunk_index = None
+        self.model = HexModel()
+        self.table = QTableView()
+        self.table.setModel(self.model)
+        self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
+        # постоянные размеры строк и столбцов: таблице не нужно
+        # просматривать все строки модели, чтобы их вычислить
+        self.table.verticalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.table.verticalHeader().setDefaultSectionSize(22)
+        self.table.horizontalHeader().setSectionResizeMode(QHeaderView.Fixed)
+        self.table.horizontalHeader().setDefaultSectionSize(30)
+        self.table.clicked.connect(self.write_byte_info)
         self.setWidgetResizable(True)
         self.setWidget(self.table)
+        self.init_actions()
+
+    def init_actions(self):
+        next_chunk = QAction('Next chunk', self.table)
+        next_chunk.setShortcut('Ctrl+Down')
+        next_chunk.triggered.connect(self.go_to_next_chunk)
+
+        previous_chunk = QAction('Previous chunk', self.table)
+        previous_chunk.setShortcut('Ctrl+Up')
+        previous_chunk.triggered.connect(self.go_to_previous_chunk)
+
+        self.table.addAction(previous_chunk)
+        self.table.addAction(next_chunk)
+        self.table.setContextMenuPolicy(Qt.ActionsContextMenu)
 
     def create_table(self):
         self.image_info = self.main_window.get_image_info()
+        self.chunk_index = ChunkIndex.from_file(self.image_info.file_name)
+        self.model.set_file(self.image_info.file_name)
 
-        with open(self.image_info.file_name, 'rb') as file:
-            byte_count = len(file.read())
-            file.seek(0)
-            row_count = byte_count // 16 + 1
+    def get_current_offset(self):
+        index = self.table.currentIndex()
+        return self.model.get_offset(index) if index.isValid() else 0
 
-            self.table.setRowCount(row_count)
-            self.table.setColumnCount(16)
-            self.table.setEditTriggers(QAbstractItemView.NoEditTriggers)
-            for row in range(row_count):
-                for column in range(16):
-                    item = QTableWidgetItem()
-                    text = file.read(1).hex()
-                    item.setTextAlignment(Qt.AlignCenter)
-                    item.setText(text)
-                    self.table.setItem(row, column, item)
+    def go_to_next_chunk(self):
+        if self.chunk_index is not None:
+            self.go_to_offset(self.chunk_index.next_start(
+                self.get_current_offset()))
 
-        self.table.cellClicked.connect(self.write_byte_info)
+    def go_to_previous_chunk(self):
+        if self.chunk_index is not None:
+            self.go_to_offset(self.chunk_index.previous_start(
+                self.get_current_offset()))
 
-    def write_byte_info(self, row, column):
-        self.main_window.byte_info_screen.update('{}, {}'.format(row, column))
+    def go_to_offset(self, offset):
+        if offset is None:
+            return
+        row, column = divmod(offset, HexModel.columns)
+        index = self.model.index(row, column)
+        self.table.setCurrentIndex(index)
+        self.table.scrollTo(index, QAbstractItemView.PositionAtTop)
+        self.write_byte_info(index)
+
+    def write_byte_info(self, index):
+        offset = self.model.get_offset(index)
+        text = 'Offset: {}'.format(offset)
+        if self.chunk_index is not None:
+            chunk, field = self.chunk_index.locate(offset)
+            if chunk is not None:
+                chunk_type, data_offset, length = \
+                    self.chunk_index.layout[chunk]
+                text += ', chunk #{} {} ({} bytes), {}'.format(
+                    chunk, chunk_type, length, field)
+                if field == 'Data':
+                    text += ' byte {}'.format(offset - data_offset)
+            elif field is not None:
+                text += ', {}'.format(field)
+        self.main_window.byte_info_screen.update(text)
 
 
 class ImageFiller(QThread):
@@ -170,26 +281,42 @@ class ImageFiller(QThread):
         self.fill_image()
 
 
+class Prefetcher(QThread):
+    def __init__(self, file_names, image_cache):
+        super().__init__()
+        self.file_names = file_names
+        self.image_cache = image_cache
+        self.stopped = False
+
+    def run(self):
+        for file_name in self.file_names:
+            if self.stopped:
+                return
+            if file_name in self.image_cache:
+                continue
+            try:
+                # stop_prefetching ждёт поток, поэтому останов проверяется
+                # и между блоками строк, а не только между файлами
+                decoder = PngDecoder(file_name)
+                for _ in decoder.iter_decode():
+                    if self.stopped:
+                        return
+                self.image_cache.put(file_name, pack_argb32(decoder.image))
+            except (AttributeError, OSError):
+                pass
+
+
 class ImageWindow(QScrollArea):
     update_image_signal = pyqtSignal()
 
     def __init__(self, main_window):
         super().__init__(main_window)
-        self.filter_method = {0: self.none,
-                              1: self.sub,
-                              2: self.up,
-                              3: self.average,
-                              4: self.paeth}
-
-        self.drawing_method = {0: self.draw_g_pixel,
-                               2: self.draw_rgb_pixel,
-                               3: self.draw_palette_pixel,
-                               4: self.draw_ga_pixel,
-                               6: self.draw_rgba_pixel}
-
         self.image = None
+        self.pixels = None
+        self.decoder = None
         self.pixmap = None
         self.filler = None
+        self.stopped = False
         self.image_info = None
         self.image_label = QLabel()
         self.main_window = main_window
@@ -209,21 +336,39 @@ class ImageWindow(QScrollArea):
     def draw_image(self, image_name):
         if image_name is not None:
             self.image_info = self.main_window.get_image_info()
-            self.image = QImage(self.image_info.info['Width'],
-                                self.image_info.info['Height'],
+            width = self.image_info.width
+            height = self.image_info.height
+            cached = self.main_window.image_cache.get(image_name)
+            # QImage рисует прямо из буфера, который заполняет ImageFiller
+            self.pixels = cached if cached is not None else \
+                np.zeros((height, width), np.uint32)
+            self.image = QImage(self.pixels.data, width, height, width * 4,
                                 QImage.Format_ARGB32)
+            if cached is not None:
+                self.update()
+                return
+
+            self.decoder = PngDecoder(self.image_info.file_name, preview=True)
+            self.stopped = False
             self.filler = ImageFiller(self.fill_image)
             self.filler.start()
 
+    def stop_filling(self):
+        if self.filler is not None:
+            self.stopped = True
+            self.filler.wait()
+
     def fill_image(self):
         try:
-            color_type = int(self.image_info.info['Color type'][0])
-            # self.check_background_color(color_type)
-            bpp = self.get_bpp()
-            scanlines = self.get_scanlines(self.image_info.info['Width'], bpp)
-            pixlines = self.cancel_filter_method(scanlines, bpp)
-            self.draw_pixels(self.drawing_method[color_type], pixlines, bpp)
-        except IndexError:
+            for start, stop in self.decoder.iter_decode():
+                if self.stopped:
+                    return
+                pack_argb32(self.decoder.image[start:stop],
+                            self.pixels[start:stop])
+                self.update_image_signal.emit()
+            self.main_window.image_cache.put(self.decoder.file_name,
+                                             self.pixels)
+        except AttributeError:
             print('Unsupported image')
 
     # def check_background_color(self, color_type):
@@ -247,179 +392,6 @@ class ImageWindow(QScrollArea):
     #             color = QRgba64.fromRgba64(*color).toArgb32()
     #         self.image.fill(QColor(color))
 
-    def draw_pixels(self, drawing_method, pixlines, bpp):
-        if pixlines is not None:
-            lines_count = len(pixlines)
-            pixels_count = self.image_info.info['Width']
-
-            for y in range(lines_count):
-                pixline = pixlines[y]
-                for x in range(pixels_count):
-                    pixel = pixline[bpp*x:bpp*(x+1)]
-                    drawing_method(pixel, x, y)
-                self.update_image_signal.emit()
-                sleep(0.00001)
-
-    def draw_rgb_pixel(self, pixel, x, y):
-        sample_len = len(pixel) // 3
-        red = int_from_bytes(pixel[0:sample_len])
-        green = int_from_bytes(pixel[sample_len:sample_len*2])
-        blue = int_from_bytes(pixel[sample_len*2:sample_len*3])
-        color = QRgba64.fromRgba64(red, green, blue, 65535).toArgb32() \
-            if sample_len == 2 else QColor(red, green, blue).rgba()
-        self.image.setPixel(x, y, color)
-
-    def draw_rgba_pixel(self, pixel, x, y):
-        sample_len = (len(pixel) - 1) // 3
-        red = int_from_bytes(pixel[0:sample_len])
-        green = int_from_bytes(pixel[sample_len:sample_len * 2])
-        blue = int_from_bytes(pixel[sample_len * 2:sample_len * 3])
-        alpha = int_from_bytes(pixel[sample_len * 3:sample_len * 4])
-        color = QRgba64.fromRgba64(red, green, blue, alpha).toArgb32() \
-            if sample_len == 2 else QColor(red, green, blue, alpha).rgba()
-        self.image.setPixel(x, y, color)
-
-    def draw_g_pixel(self, pixel, x, y):
-        sample_len = len(pixel)
-        gray = int_from_bytes(pixel)
-        color = QRgba64.fromRgba64(gray, gray, gray, 65535).toArgb32()\
-            if sample_len == 2 else QColor(gray, gray, gray).rgba()
-        self.image.setPixel(x, y, color)
-
-    def draw_ga_pixel(self, pixel, x, y):
-        sample_len = len(pixel)
-        gray = int_from_bytes(pixel[0:sample_len])
-        alpha = int_from_bytes(pixel[sample_len:sample_len*2])
-        color = QRgba64.fromRgba64(gray, gray, gray, alpha).toArgb32() \
-            if sample_len == 2 else QColor(gray, gray, gray, alpha).rgba()
-        self.image.setPixel(x, y, color)
-
-    def draw_palette_pixel(self, pixel, x, y):
-        index = int_from_bytes(pixel)
-        color = self.get_palette_color(index)
-        self.image.setPixel(x, y, QColor(*color).rgba())
-
-    def get_palette_color(self, index):
-        color = self.image_info.chunks['PLTE'][index*3:index*3 + 3]
-        red, green, blue = color[0], color[1], color[2]
-        return red, green, blue
-
-    def cancel_filter_method(self, scanlines, bpp):
-        try:
-            pixlines = []
-            prev_line = None
-            for line in scanlines:
-                filter_type = line[0]  # First byte is filter id
-                pixline = self.filter_method[filter_type](prev_line,
-                                                          line[1:], bpp)
-                pixlines.append(pixline)
-                prev_line = pixline
-            return pixlines
-        except KeyError:
-            print('Unsupported image')
-
-    @staticmethod
-    def none(prev_line, line, bpp):
-        return line
-
-    @staticmethod
-    def sub(prev_line, line, bpp):
-        pixline = b''
-        for i in range(len(line)):
-            left_byte = 0 if i - bpp < 0 else pixline[i - bpp]
-            byte = line[i]
-            real_byte = (byte + left_byte) % 256
-            pixline += real_byte.to_bytes(1, byteorder='big')
-        return pixline
-
-    @staticmethod
-    def up(prev_line, line, bpp):
-        pixline = b''
-        for i in range(len(line)):
-            upper_byte = prev_line[i] if prev_line is not None else 0
-            byte = line[i]
-            real_byte = (byte + upper_byte) % 256
-            pixline += real_byte.to_bytes(1, byteorder='big')
-        return pixline
-
-    @staticmethod
-    def average(prev_line, line, bpp):
-        pixline = b''
-        for i in range(len(line)):
-            left_byte = 0 if i - bpp < 0 else pixline[i - bpp]
-            upper_byte = prev_line[i] if prev_line is not None else 0
-            byte = line[i]
-            real_byte = int((byte + floor(left_byte + upper_byte)/2) % 256)
-            pixline += real_byte.to_bytes(1, byteorder='big')
-        return pixline
-
-    @staticmethod
-    def paeth(prev_line, line, bpp):
-        pixline = b''
-        for i in range(len(line)):
-            left_byte = 0 if i - bpp < 0 else pixline[i - bpp]
-            upper_byte = prev_line[i] if prev_line is not None else 0
-            upper_left_byte = 0 if i - bpp < 0 or prev_line is None \
-                else prev_line[i - bpp]
-            byte = line[i]
-            predictor = ImageWindow.paeth_predictor(left_byte, upper_byte,
-                                                    upper_left_byte)
-            real_byte = (byte + predictor) % 256
-            pixline += real_byte.to_bytes(1, byteorder='big')
-        return pixline
-
-    @staticmethod
-    def paeth_predictor(left, above, upper_left):
-        p = left + above - upper_left
-        p_left = abs(p - left)
-        p_above = abs(p - above)
-        p_upper_left = abs(p - upper_left)
-
-        if p_left <= p_above and p_left <= p_upper_left:
-            return left
-        if p_above <= p_upper_left:
-            return above
-        return upper_left
-
-    def get_scanlines(self, width, bpp):
-        compressed_data = self.image_info.chunks['IDAT']
-        scanline_len = width * bpp + 1
-        scanlines = []
-
-        data = b''
-        for byte_line in compressed_data:
-            data += byte_line
-
-        data = decompress(data)
-
-        i = 0
-        while True:
-            entry = data[scanline_len*i:scanline_len*(i+1)]
-            if entry == b'':
-                break
-            scanlines.append(entry)
-            i += 1
-
-        return scanlines
-
-    def get_bpp(self):
-        bytes_to_sample = 2 if self.image_info.info['Bit depth'] == 16 else 1
-        samples_count = 0
-        bytes_to_alpha = 1
-        is_alpha = False
-        color_type = int(self.image_info.info['Color type'][0])
-
-        if color_type in (0, 3, 4):
-            samples_count = 1
-        if color_type in (2, 6):
-            samples_count = 3
-        if color_type in (4, 6):
-            is_alpha = True
-
-        bpp = bytes_to_sample * samples_count
-        bpp += bytes_to_alpha if is_alpha else 0
-        return bpp
-
     # def draw_image(self, image_name):
     #     if image_name is not None:
     #         self.image_label.setPixmap(QPixmap(image_name))
@@ -438,7 +410,8 @@ class ImageInfoWindow(QScrollArea):
 
     def update(self):
         if self.main_window.current_file is not None:
-            self.image_info = PngInfo(self.main_window.current_file)
+            self.image_info = self.main_window.info_cache.get_info(
+                self.main_window.current_file)
             self.image_info_list.addItems(str(self.image_info).split('\n'))
 
 
@@ -478,6 +451,19 @@ class FileSwitcher(QWidget):
             cur_file_index = png_files.index(self.main_window.current_file)
             self.main_window.open_image_file(png_files[cur_file_index - 1])
 
+    def get_neighbour_png_files(self):
+        # следующий и предыдущий файлы в том же порядке, что и у кнопок
+        if self.main_window.current_file is None:
+            return []
+        png_files = self.get_all_png_files_in_current_dir()
+        if self.main_window.current_file not in png_files:
+            return []
+        cur_file_index = png_files.index(self.main_window.current_file)
+        next_file = png_files[(cur_file_index + 1) % len(png_files)]
+        previous_file = png_files[cur_file_index - 1]
+        return [file for file in (next_file, previous_file)
+                if file != self.main_window.current_file]
+
     def get_all_png_files_in_current_dir(self):
         current_file = self.main_window.current_file
         current_dir = os.path.dirname(current_file)
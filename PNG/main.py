@@ -1,6 +1,8 @@
 import sys
 import argparse
 from png import PngInfo
+from scanner import scan, verify, write_json, write_csv
+from cache import InfoCache
 from graphic import MainWindow
 from PyQt5.QtWidgets import QApplication
 
@@ -11,13 +13,44 @@ def try_start_console_mode():
 
     parser.add_argument('-f', '--file', type=str,
                         help='print png file info into console')
+    parser.add_argument('-b', '--batch', type=str, nargs='+',
+                        help='print one row per png file found in '
+                             'directories or glob patterns')
+    parser.add_argument('-w', '--workers', type=int, default=None,
+                        help='processes for batch mode (default: CPU count)')
+    parser.add_argument('-c', '--chunksize', type=int, default=64,
+                        help='files sent to a process at once in batch mode')
+    parser.add_argument('--format', choices=('json', 'csv'), default='json',
+                        help='batch mode output format')
+    # CRC проверяется заново при каждом запуске, кэш к ней не применяется
+    batch_mode = parser.add_mutually_exclusive_group()
+    batch_mode.add_argument('--cache', type=str, nargs='?', const=True,
+                            help='reuse batch rows of unchanged files from '
+                                 'an sqlite cache '
+                                 '(default: ~/.png_info.sqlite)')
+    batch_mode.add_argument('--verify', action='store_true',
+                            help='check CRC of every chunk in batch mode and '
+                                 'report throughput')
 
-    args = parser.parse_args()
-    return args.file
+    return parser.parse_args()
 
 
 if __name__ == '__main__':
-    filename = try_start_console_mode()
+    args = try_start_console_mode()
+    filename = args.file
+
+    if args.batch:
+        writer = write_csv if args.format == 'csv' else write_json
+        if args.verify:
+            rows = verify(args.batch, args.workers, args.chunksize)
+        else:
+            cache = None
+            if args.cache:
+                cache = InfoCache() if args.cache is True \
+                    else InfoCache(args.cache)
+            rows = scan(args.batch, args.workers, args.chunksize, cache=cache)
+        writer(rows, sys.stdout)
+        exit()
 
     if filename:
         try:
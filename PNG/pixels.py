@@ -0,0 +1,135 @@
+import numpy as np
+
+
+def get_unpack_table(depth):
+    # для каждого значения байта - его отсчёты по depth бит, старшие первыми,
+    # упакованные в одно число: выборка по таблице даёт сразу 8 // depth
+    # отсчётов на байт
+    values = np.arange(256, dtype=np.uint8)[:, np.newaxis]
+    shifts = np.arange(8 - depth, -1, -depth, dtype=np.uint8)
+    samples = (values >> shifts) & ((1 << depth) - 1)
+    item_type = {2: np.uint32, 4: np.uint16}[depth]
+    return np.ascontiguousarray(samples).view(item_type).ravel()
+
+
+unpack_tables = {2: get_unpack_table(2), 4: get_unpack_table(4)}
+
+
+def pack_argb32(rgba, out=None):
+    # RGBA (8 или 16 бит на канал) -> 0xAARRGGBB, формат QImage.Format_ARGB32
+    if rgba.dtype == np.uint16:
+        rgba = rgba >> 8
+    rgba = rgba.astype(np.uint32)
+    if out is None:
+        out = np.empty(rgba.shape[:-1], np.uint32)
+
+    out[:] = rgba[..., 3] << 24 | rgba[..., 0] << 16 | \
+        rgba[..., 1] << 8 | rgba[..., 2]
+    return out
+
+
+class PixelConverter:
+    # Переводит строки без фильтров в пиксели RGBA сразу для целого
+    # блока строк. Каналы остаются 16-битными, если таков исходный файл.
+    samples_per_pixel = {0: 1, 2: 3, 3: 1, 4: 2, 6: 4}
+    bit_depths = {0: (1, 2, 4, 8, 16), 2: (8, 16), 3: (1, 2, 4, 8),
+                  4: (8, 16), 6: (8, 16)}
+
+    def __init__(self, width, color_type, bit_depth, palette=None,
+                 transparency=None):
+        if color_type not in self.samples_per_pixel.keys():
+            raise AttributeError('Incorrect color type: {}'.format(
+                color_type))
+        if bit_depth not in self.bit_depths[color_type]:
+            raise AttributeError('Incorrect bit depth: {}'.format(
+                bit_depth))
+        if color_type == 3 and palette is None:
+            raise AttributeError('Incorrect PLTE chunk')
+
+        self.width = width
+        self.color_type = color_type
+        self.bit_depth = bit_depth
+        self.palette = palette
+        self.transparency = transparency
+        self.channels = self.samples_per_pixel[color_type]
+        self.dtype = np.uint16 if bit_depth == 16 else np.uint8
+        self.max_value = 65535 if bit_depth == 16 else 255
+
+        bits_per_pixel = self.channels * bit_depth
+        self.row_len = (width * bits_per_pixel + 7) // 8
+        self.bpp = max(1, bits_per_pixel // 8)  # шаг фильтров в байтах
+
+        self.palette_table = None
+        self.transparent_color = None
+        if color_type == 3:
+            self.palette_table = self.get_palette_table(palette, transparency)
+        elif transparency is not None and color_type in (0, 2):
+            key = np.frombuffer(bytes(transparency[:2 * self.channels]),
+                                '>u2')
+            if len(key) == self.channels:
+                self.transparent_color = key
+
+    def with_width(self, width):
+        return PixelConverter(width, self.color_type, self.bit_depth,
+                              self.palette, self.transparency)
+
+    @staticmethod
+    def get_palette_table(palette, transparency):
+        # 256 записей: индексы за пределами палитры дают чёрный цвет
+        table = np.zeros((256, 4), np.uint8)
+        table[:, 3] = 255
+        colors_count = min(len(palette) // 3, 256)
+        colors = np.frombuffer(bytes(palette[:colors_count * 3]), np.uint8)
+        table[:colors_count, :3] = colors.reshape(-1, 3)
+
+        if transparency is not None:
+            entries = np.frombuffer(bytes(transparency[:colors_count]),
+                                    np.uint8)
+            table[:len(entries), 3] = entries
+        return table
+
+    def get_samples(self, rows):
+        rows = np.asarray(rows, np.uint8)
+        if self.bit_depth == 16:
+            samples = rows.view('>u2').astype(np.uint16)
+        elif self.bit_depth < 8:
+            samples = self.unpack(rows)
+        else:
+            samples = rows
+        samples = samples[:, :self.width * self.channels]
+        return samples.reshape(len(rows), self.width, self.channels)
+
+    def unpack(self, rows):
+        if self.bit_depth == 1:
+            return np.unpackbits(rows, axis=1)
+        samples = unpack_tables[self.bit_depth][rows]
+        return samples.view(np.uint8).reshape(len(rows), -1)
+
+    def to_rgba(self, rows, out=None):
+        samples = self.get_samples(rows)
+        if out is None:
+            out = np.empty(samples.shape[:2] + (4,), self.dtype)
+
+        if self.color_type == 3:
+            np.take(self.palette_table, samples[:, :, 0], axis=0, out=out)
+            return out
+
+        if self.color_type in (0, 4):
+            gray = samples[:, :, :1]
+            if self.bit_depth < 8:
+                gray = gray * (255 // ((1 << self.bit_depth) - 1))
+            out[:, :, :3] = gray
+        else:
+            out[:, :, :3] = samples[:, :, :3]
+
+        if self.color_type in (4, 6):
+            out[:, :, 3] = samples[:, :, -1]
+        else:
+            out[:, :, 3] = self.max_value
+            if self.transparent_color is not None:
+                hidden = (samples == self.transparent_color).all(axis=2)
+                out[:, :, 3][hidden] = 0
+        return out
+
+    def to_argb32(self, rows, out=None):
+        return pack_argb32(self.to_rgba(rows), out)
@@ -1,11 +1,120 @@
-from zlib import decompress
+import numpy as np
+from bisect import bisect_right
+from mmap import mmap, ACCESS_READ
+from zlib import decompress, decompressobj, crc32
+from itertools import repeat, chain, islice
 from collections import OrderedDict
+from filters import Unfilter
+from pixels import PixelConverter
+
+# сколько сжатых байт за раз подаётся в zlib
+INFLATE_BLOCK = 16384
 
 
 def int_from_bytes(bytes_line):
     return int.from_bytes(bytes_line, byteorder='big')
 
 
+def read_chunk_records(file):
+    # (тип, смещение данных, длина) без чтения самих данных чанка;
+    # чанк, выходящий за конец файла (обрезанный файл или испорченная
+    # длина), и неполный заголовок в конце файла - ошибки формата
+    offset = file.tell()
+    file.seek(0, 2)
+    end = file.tell()
+    while True:
+        file.seek(offset)
+        header = file.read(8)
+        if not header:
+            return
+        if len(header) < 8:
+            raise AttributeError('Incorrect chunk header')
+
+        length = int_from_bytes(header[:4])
+        chunk_type = header[4:].decode('ascii', errors='replace')
+        if offset + 12 + length > end:
+            raise AttributeError('Incorrect {} chunk'.format(chunk_type))
+        yield chunk_type, offset + 8, length
+
+        if chunk_type == 'IEND':
+            return
+        offset += 12 + length
+
+
+def iter_scanlines(compressed_chunks, scanline_lengths):
+    # распаковывает IDAT по мере поступления, держа в памяти не больше
+    # одной строки распакованных данных
+    decompressor = decompressobj()
+    lengths = iter(scanline_lengths)
+    length = next(lengths, None)
+    buffer = bytearray()
+
+    for chunk in compressed_chunks:
+        chunk = memoryview(chunk)
+        for start in range(0, len(chunk), INFLATE_BLOCK):
+            data = chunk[start:start + INFLATE_BLOCK]
+            while data and length is not None:
+                buffer += decompressor.decompress(data, length)
+                data = decompressor.unconsumed_tail
+                while length is not None and len(buffer) >= length:
+                    yield bytes(buffer[:length])
+                    del buffer[:length]
+                    length = next(lengths, None)
+            if length is None:
+                return
+
+    buffer += decompressor.flush()
+    while length is not None and buffer:
+        yield bytes(buffer[:length])
+        del buffer[:length]
+        length = next(lengths, None)
+
+
+class ChunkIndex:
+    # Границы чанков в файле, отсортированные по смещению: чанк и поле
+    # по смещению любого байта находятся двоичным поиском
+    fields = ((4, 'Length'), (8, 'Type'))
+
+    def __init__(self, layout):
+        self.layout = layout
+        self.starts = [offset - 8 for _, offset, _ in layout]
+
+    @classmethod
+    def from_file(cls, file_name):
+        return cls(list(PngParser(file_name).iter_chunks()))
+
+    def __len__(self):
+        return len(self.layout)
+
+    def locate(self, offset):
+        # (номер чанка, поле); вне чанков номер равен None
+        if offset < len(PngParser.signature):
+            return None, 'Signature'
+
+        index = bisect_right(self.starts, offset) - 1
+        if index < 0:
+            return None, None
+        position = offset - self.starts[index]
+        length = self.layout[index][2]
+        for end, field in self.fields:
+            if position < end:
+                return index, field
+        if position < 8 + length:
+            return index, 'Data'
+        if position < 12 + length:
+            return index, 'CRC'
+        return None, None
+
+    def next_start(self, offset):
+        index = bisect_right(self.starts, offset)
+        return self.starts[index] if index < len(self.starts) else None
+
+    def previous_start(self, offset):
+        # перед первым чанком - начало файла с сигнатурой PNG
+        index = bisect_right(self.starts, offset - 1) - 1
+        return self.starts[index] if index >= 0 else 0
+
+
 class PngParser:
     signature = b'\x89PNG\r\n\x1a\n'
 
@@ -13,45 +122,138 @@ class PngParser:
         self.file_name = file_name
         self.check_name()
         self.chunks = OrderedDict()
+        self.layout = []
+        self.mapping = None
+        self.view = None
+        self.check_crc = False
         self.init_chunks()
 
     def check_name(self):
         if len(self.file_name) <= 4 or self.file_name[-4:] != '.png':
             raise AttributeError('This is not .png file')
 
-    def parse(self):
+    def parse(self, streaming=False, mapped=False, check_crc=False):
+        # check_crc сверяет CRC каждого чанка прямо по отображению файла
+        self.check_crc = check_crc
+        parsed = False
+        try:
+            if mapped or check_crc:
+                self.map_file()
+                self.read_chunks(self.mapping, streaming)
+            else:
+                with open(self.file_name, 'rb') as file:
+                    self.read_chunks(file, streaming)
+
+            self.check_on_required_chunks()
+            parsed = True
+        except (FileNotFoundError, PermissionError, FileExistsError):
+            raise AttributeError('Incorrect image path')
+        finally:
+            if not parsed:
+                self.close()  # отображение не переживает ошибку разбора
+
+    def parse_header(self):
         try:
             with open(self.file_name, 'rb') as file:
                 self.check_on_png_signature(file.read(8))
-                chunk_len = -1
-
-                while chunk_len != 0:
-                    chunk_len = int_from_bytes(file.read(4))
-                    current_chunk = self.read_next_chunk(file, chunk_len)
-                    if current_chunk == 'IEND':
-                        self.chunks['IEND'] = True
-                    file.read(4)
+                header = file.read(25)  # длина, тип, 13 байт данных, CRC
+        except (FileNotFoundError, PermissionError, FileExistsError):
+            raise AttributeError('Incorrect image path')
 
-            self.check_on_required_chunks()
-        except FileNotFoundError or PermissionError or FileExistsError:
+        if len(header) < 21 or header[4:8] != b'IHDR' or \
+                int_from_bytes(header[:4]) != 13:
+            raise AttributeError('Incorrect IHDR chunk')
+        self.chunks['IHDR'] = header[8:21]
+
+    def read_chunks(self, file, streaming):
+        self.check_on_png_signature(file.read(8))
+
+        for chunk_type, offset, length in read_chunk_records(file):
+            self.layout.append((chunk_type, offset, length))
+            if self.check_crc and not self.check_chunk_crc(offset, length):
+                raise AttributeError('Incorrect {} chunk CRC'.format(
+                    chunk_type))
+            if chunk_type != 'IDAT':
+                self.store_chunk(chunk_type, file.read(length))
+            elif self.view is not None:
+                self.store_chunk(chunk_type,
+                                 self.view[offset:offset + length])
+            elif streaming:
+                self.store_chunk(chunk_type, (offset, length))
+            else:
+                self.store_chunk(chunk_type, file.read(length))
+
+    def check_chunk_crc(self, offset, length):
+        # CRC считается по типу и данным чанка, без копирования
+        data = self.view[offset - 4:offset + length]
+        crc = self.view[offset + length:offset + length + 4]
+        return len(crc) == 4 and crc32(data) == int_from_bytes(crc)
+
+    def map_file(self):
+        with open(self.file_name, 'rb') as file:
+            try:
+                self.mapping = mmap(file.fileno(), 0, access=ACCESS_READ)
+            except ValueError:
+                raise AttributeError('Incorrect PNG signature')
+        self.view = memoryview(self.mapping)
+
+    def close(self):
+        # представления IDAT ссылаются на отображение файла,
+        # их нужно освободить до закрытия mmap
+        if self.view is not None:
+            for data in self.chunks['IDAT']:
+                data.release()
+            self.chunks['IDAT'] = []
+            self.view.release()
+            self.view = None
+        if self.mapping is not None:
+            try:
+                self.mapping.close()
+            except BufferError:
+                # на отображение ещё ссылаются снаружи, оно закроется
+                # вместе с последним представлением
+                pass
+            self.mapping = None
+
+    def iter_chunks(self):
+        try:
+            with open(self.file_name, 'rb') as file:
+                self.check_on_png_signature(file.read(8))
+                yield from read_chunk_records(file)
+        except (FileNotFoundError, PermissionError, FileExistsError):
             raise AttributeError('Incorrect image path')
 
-    def read_next_chunk(self, file, chunk_len):
-        name_in_bytes = file.read(4)
-        current_chunk = name_in_bytes.decode('ascii')
+    def read_chunk_data(self, offset, length):
+        with open(self.file_name, 'rb') as file:
+            file.seek(offset)
+            return file.read(length)
+
+    def iter_idat(self):
+        if self.view is not None:
+            yield from self.chunks['IDAT']
+            return
 
+        with open(self.file_name, 'rb') as file:
+            for data in self.chunks['IDAT']:
+                if type(data) == tuple:
+                    offset, length = data
+                    file.seek(offset)
+                    data = file.read(length)
+                yield data
+
+    def store_chunk(self, current_chunk, data):
+        if current_chunk == 'IEND':
+            self.chunks['IEND'] = True
+            return
         if not current_chunk.isalpha():
-            file.read(chunk_len)
             return
 
         if current_chunk not in self.chunks.keys():
             self.chunks[current_chunk] = None
         if self.chunks[current_chunk] is None:
-            self.chunks[current_chunk] = file.read(chunk_len)
+            self.chunks[current_chunk] = data
         elif type(self.chunks[current_chunk]) == list:
-            self.chunks[current_chunk].append(file.read(chunk_len))
-
-        return current_chunk
+            self.chunks[current_chunk].append(data)
 
     def init_chunks(self):
         # главные
@@ -110,13 +312,13 @@ class PngInfo:
                         2: 'Saturation', 3: 'Absolute colorimetric'}
     interlace = {0: 'Noninterlaced', 1: 'Adam7 Interlace'}
 
-    def __init__(self, file_name):
+    def __init__(self, file_name, header_only=False, info=None):
+        # info - готовые сведения (например, из cache.InfoCache):
+        # тогда файл не читается, пока не понадобятся chunks или заголовок
         self.parser = PngParser(file_name)
-        self.parser.parse()
         self.file_name = file_name
-        self.chunks = self.parser.chunks
-        self.info = OrderedDict()
-        self.info['Chunks'] = str(self.parser.get_initialised_chunks_list())
+        self.is_parsed = False
+        self.parsed_info = info
         self.chunk_processors = {'IHDR': self.set_header_info,
                                  'tRNS': self.set_transparency_info,
                                  'gAMA': self.set_gamma_info,
@@ -132,7 +334,69 @@ class PngInfo:
                                  'sPLT': self.set_suggested_palette_info,
                                  'hIST': self.set_palette_histogram_info,
                                  'tIME': self.set_time_info}
-        self.set_info()
+        if header_only:
+            self.parser.parse_header()
+        elif info is None:
+            self.parse()
+
+    @classmethod
+    def header_only(cls, file_name):
+        # читает только сигнатуру и IHDR (33 байта); остальные чанки
+        # разбираются при первом обращении к chunks или info
+        return cls(file_name, header_only=True)
+
+    def parse(self):
+        if not self.is_parsed:
+            self.parser.parse(streaming=True)
+            self.is_parsed = True
+
+    @property
+    def chunks(self):
+        self.parse()
+        return self.parser.chunks
+
+    @property
+    def info(self):
+        if self.parsed_info is None:
+            self.parse()
+            info = OrderedDict()
+            info['Chunks'] = str(self.parser.get_initialised_chunks_list())
+            # обработчики чанков пишут через self.info; после ошибки
+            # недозаполненные сведения не должны остаться разобранными
+            self.parsed_info = info
+            try:
+                self.set_info()
+            except BaseException:
+                # zlib.error, UnicodeDecodeError и прочие ошибки чанков
+                self.parsed_info = None
+                raise
+        return self.parsed_info
+
+    @property
+    def header(self):
+        if self.parser.chunks['IHDR'] is None:
+            self.parser.parse_header()
+        return self.parser.chunks['IHDR']
+
+    @property
+    def width(self):
+        return int_from_bytes(self.header[:4])
+
+    @property
+    def height(self):
+        return int_from_bytes(self.header[4:8])
+
+    @property
+    def bit_depth(self):
+        return self.header[8]
+
+    @property
+    def color_type_index(self):
+        return self.header[9]
+
+    @property
+    def interlace_method(self):
+        return self.header[12]
 
     def set_info(self):
         for chunk in self.parser.chunks.keys():
@@ -360,3 +624,106 @@ class PngInfo:
         for key, value in self.info.items():
             result += ' {}: {} \n'.format(key, value)
         return result
+
+
+class PngDecoder:
+    band_height = 64  # строк, переводимых в RGBA за один раз
+    # проходы Adam7: (первый столбец, первая строка, шаг по x, шаг по y)
+    adam7 = ((0, 0, 8, 8), (4, 0, 8, 8), (0, 4, 4, 8), (2, 0, 4, 4),
+             (0, 2, 2, 4), (1, 0, 2, 2), (0, 1, 1, 2))
+
+    def __init__(self, file_name, preview=False):
+        self.file_name = file_name
+        self.parser = PngParser(file_name)
+        self.preview = preview
+        self.image = None
+
+    def decode(self):
+        for _ in self.iter_decode():
+            pass
+        return self.image
+
+    def iter_decode(self):
+        # заполняет self.image и после каждого блока строк (или прохода
+        # Adam7) сообщает, какие строки (start, stop) изменились
+        self.parser.parse(mapped=True)
+        try:
+            header = self.parser.chunks['IHDR']
+            width = int_from_bytes(header[:4])
+            height = int_from_bytes(header[4:8])
+            interlace = header[12]
+            if interlace not in (0, 1):
+                raise AttributeError('Incorrect interlace method: {}'.
+                                     format(interlace))
+
+            converter = PixelConverter(width, header[9], header[8],
+                                       self.parser.chunks['PLTE'],
+                                       self.parser.chunks['tRNS'])
+            self.image = np.zeros((height, width, 4), converter.dtype)
+
+            if interlace == 0:
+                scanlines = iter_scanlines(self.parser.iter_idat(),
+                                           repeat(converter.row_len + 1,
+                                                  height))
+                yield from self.decode_rows(converter, scanlines, self.image)
+            else:
+                yield from self.decode_passes(converter, width, height)
+        finally:
+            self.parser.close()
+
+    def decode_passes(self, converter, width, height):
+        passes = []
+        for x, y, dx, dy in self.adam7:
+            pass_width = (width - x + dx - 1) // dx
+            pass_height = (height - y + dy - 1) // dy
+            if pass_width > 0 and pass_height > 0:
+                passes.append((x, y, dx, dy, pass_height,
+                               converter.with_width(pass_width)))
+
+        lengths = chain.from_iterable(
+            repeat(pass_converter.row_len + 1, pass_height)
+            for _, _, _, _, pass_height, pass_converter in passes)
+        scanlines = iter_scanlines(self.parser.iter_idat(), lengths)
+
+        for x, y, dx, dy, pass_height, pass_converter in passes:
+            # строки прохода пишутся сразу в прореженное представление
+            # итогового изображения
+            target = self.image[y::dy, x::dx]
+            for _ in self.decode_rows(pass_converter,
+                                      islice(scanlines, pass_height), target):
+                pass
+            if self.preview and (x, y) == (0, 0):
+                self.fill_preview(target)
+            yield 0, height
+
+    def fill_preview(self, first_pass):
+        # первый проход даёт каждый 64-й пиксель: растягиваем его
+        # блоками 8x8, следующие проходы перезапишут эти блоки
+        height, width = self.image.shape[:2]
+        blocks = np.repeat(np.repeat(first_pass, 8, axis=0), 8, axis=1)
+        self.image[:] = blocks[:height, :width]
+
+    def decode_rows(self, converter, scanlines, target):
+        row_len = converter.row_len
+        rows = Unfilter(row_len, converter.bpp).unfilter_all(scanlines)
+        band = np.empty((self.band_height, row_len), np.uint8)
+        y = count = 0
+
+        for row in rows:
+            band[count] = np.frombuffer(row, np.uint8)
+            count += 1
+            if count == self.band_height:
+                converter.to_rgba(band, target[y:y + count])
+                yield y, y + count
+                y += count
+                count = 0
+
+        if count != 0:
+            converter.to_rgba(band[:count], target[y:y + count])
+            yield y, y + count
+
+
+def decode(file_name):
+    # пиксели изображения массивом (высота, ширина, 4) в RGBA:
+    # uint16 для 16-битных файлов, uint8 для остальных
+    return PngDecoder(file_name).decode()
@@ -0,0 +1,156 @@
+import os
+import csv
+import glob
+import json
+from timeit import default_timer
+from collections import OrderedDict
+from concurrent.futures import ProcessPoolExecutor
+from png import PngParser, PngInfo, int_from_bytes, read_chunk_records
+
+fields = ('File', 'Width', 'Height', 'Bit depth', 'Color type',
+          'Interlace method', 'Chunks', 'Text keys', 'Error')
+text_chunks = ('tEXt', 'zTXt', 'iTXt')
+
+
+def find_png_files(paths):
+    for path in paths:
+        if os.path.isdir(path):
+            for root, dirs, files in os.walk(path):
+                dirs.sort()
+                for file in sorted(files):
+                    if file[-4:] == '.png':
+                        yield os.path.join(root, file)
+        else:
+            yield from sorted(glob.glob(path, recursive=True))
+
+
+def scan_file(file_name):
+    row = OrderedDict((field, None) for field in fields)
+    row['File'] = file_name
+    row['Chunks'] = []
+    row['Text keys'] = []
+
+    try:
+        parser = PngParser(file_name)
+        with open(file_name, 'rb') as file:
+            parser.check_on_png_signature(file.read(8))
+            for chunk_type, offset, length in read_chunk_records(file):
+                if chunk_type not in row['Chunks']:
+                    row['Chunks'].append(chunk_type)
+                if chunk_type == 'IHDR':
+                    set_header_fields(row, file.read(length))
+                elif chunk_type in text_chunks:
+                    # ключевое слово - не длиннее 79 байт до первого нуля
+                    keyword = file.read(min(length, 80)).split(b'\x00')[0]
+                    row['Text keys'].append(keyword.decode('latin-1'))
+        if row['Width'] is None:
+            raise AttributeError('Incorrect IHDR chunk')
+        if 'IEND' not in row['Chunks']:
+            raise AttributeError('Incorrect IEND chunk')
+    except (AttributeError, OSError) as e:
+        row['Error'] = str(e.args[-1])
+
+    return row
+
+
+def set_header_fields(row, header):
+    if len(header) != 13:
+        raise AttributeError('Incorrect IHDR chunk')
+
+    row['Width'] = int_from_bytes(header[:4])
+    row['Height'] = int_from_bytes(header[4:8])
+    row['Bit depth'] = header[8]
+    row['Color type'] = '{} ({})'.format(
+        header[9], PngInfo.color_type.get(header[9], 'Unknown'))
+    row['Interlace method'] = '{} ({})'.format(
+        header[12], PngInfo.interlace.get(header[12], 'Unknown'))
+
+
+def verify_file(file_name):
+    row = OrderedDict((('File', file_name), ('Size', None),
+                       ('Chunks checked', 0), ('Corrupted chunks', []),
+                       ('MB/s', None), ('Error', None)))
+    start = default_timer()
+
+    try:
+        parser = PngParser(file_name)
+        parser.map_file()
+        try:
+            parser.check_on_png_signature(parser.mapping.read(8))
+            chunk_types = set()
+            for chunk_type, offset, length in read_chunk_records(
+                    parser.mapping):
+                row['Chunks checked'] += 1
+                chunk_types.add(chunk_type)
+                if not parser.check_chunk_crc(offset, length):
+                    row['Corrupted chunks'].append('{} at {}'.format(
+                        chunk_type, offset - 8))
+            # файл, обрезанный ровно по границе чанка, иначе сошёл бы
+            # за целый
+            for chunk_type in ('IHDR', 'IDAT', 'IEND'):
+                if chunk_type not in chunk_types:
+                    raise AttributeError('Incorrect {} chunk'.format(
+                        chunk_type))
+        finally:
+            parser.close()
+    except (AttributeError, OSError) as e:
+        row['Error'] = str(e.args[-1])
+
+    seconds = default_timer() - start
+    if row['Error'] is None:
+        row['Size'] = os.path.getsize(file_name)
+        row['MB/s'] = round(row['Size'] / max(seconds, 1e-9) / 1e6, 1)
+    return row
+
+
+def scan(paths, workers=None, chunksize=64, function=scan_file, cache=None):
+    # строки выдаются в порядке файлов, по мере готовности;
+    # с cache в процессы уходят только новые или изменённые файлы,
+    # а их строки записываются в cache одной транзакцией в конце
+    file_names = list(find_png_files(paths))
+    cached_rows = {}
+    if cache is not None:
+        for file_name in file_names:
+            row = cache.get(file_name, 'scan')
+            if row is not None:
+                cached_rows[file_name] = row
+
+    missing = [file_name for file_name in file_names
+               if file_name not in cached_rows]
+    new_rows = []
+    try:
+        with ProcessPoolExecutor(workers) as executor:
+            rows = executor.map(function, missing, chunksize=chunksize)
+            for file_name in file_names:
+                if file_name in cached_rows:
+                    yield cached_rows[file_name]
+                    continue
+
+                row = next(rows)
+                if row['Error'] is None:
+                    new_rows.append((file_name, row))
+                yield row
+    finally:
+        if cache is not None and new_rows:
+            cache.put_many(new_rows, 'scan')
+
+
+def verify(paths, workers=None, chunksize=64):
+    return scan(paths, workers, chunksize, verify_file)
+
+
+def write_json(rows, output):
+    for row in rows:
+        output.write(json.dumps(row, ensure_ascii=False) + '\n')
+
+
+def write_csv(rows, output):
+    writer = None
+    for row in rows:
+        if writer is None:
+            writer = csv.DictWriter(output, list(row.keys()))
+            writer.writeheader()
+        for key, value in row.items():
+            if type(value) == list:
+                row[key] = ';'.join(value)
+        writer.writerow(row)
@@ -1,11 +1,22 @@
 import os
 import sys
+import zlib
+import shutil
+import tempfile
 import unittest
+import numpy as np
+from itertools import repeat
 
 sys.path.append(os.path.join(os.path.dirname(os.path.abspath(__file__)),
                              os.path.pardir))
 
-from png import PngParser, PngInfo
+from png import PngParser, PngInfo, PngDecoder, ChunkIndex, \
+    int_from_bytes, iter_scanlines, decode
+from filters import Unfilter
+from pixels import PixelConverter
+from benchmark import legacy_unfilter
+from scanner import scan, scan_file, find_png_files, verify, verify_file
+from cache import InfoCache, ImageCache
 
 
 class TestParser(unittest.TestCase):
@@ -29,6 +40,135 @@ class TestParser(unittest.TestCase):
         self.assertEqual(13, len(header_bytes))
         self.assertEqual(bytes, type(header_bytes))
 
+    def test_iter_chunks_yields_records(self):
+        parser = PngParser(os.path.join(self.suite, 'ct1n0g04.png'))
+        records = list(parser.iter_chunks())
+        self.assertEqual(('IHDR', 16, 13), records[0])
+        self.assertEqual('IEND', records[-1][0])
+        self.assertEqual(0, records[-1][2])
+        self.assertTrue(any(record[0] == 'tEXt' for record in records))
+
+    def test_chunk_index_locates_fields(self):
+        index = ChunkIndex.from_file(os.path.join(self.suite,
+                                                  'ct1n0g04.png'))
+        self.assertEqual((None, 'Signature'), index.locate(0))
+        self.assertEqual((0, 'Length'), index.locate(8))
+        self.assertEqual((0, 'Type'), index.locate(12))
+        self.assertEqual((0, 'Data'), index.locate(16))
+        self.assertEqual((0, 'CRC'), index.locate(29))
+        self.assertEqual((1, 'Length'), index.locate(33))
+        last = len(index) - 1
+        self.assertEqual((last, 'CRC'), index.locate(index.starts[-1] + 8))
+        self.assertEqual((None, None), index.locate(index.starts[-1] + 12))
+
+    def test_chunk_index_boundaries(self):
+        index = ChunkIndex.from_file(os.path.join(self.suite,
+                                                  'ct1n0g04.png'))
+        self.assertEqual(8, index.next_start(0))
+        self.assertEqual(33, index.next_start(8))
+        self.assertEqual(8, index.previous_start(20))
+        self.assertEqual(8, index.previous_start(33))
+        self.assertEqual(0, index.previous_start(8))
+        self.assertEqual(0, index.previous_start(3))
+        self.assertIsNone(index.next_start(index.starts[-1]))
+
+    def test_streaming_parse_does_not_load_idat(self):
+        file_name = os.path.join(self.suite, 'basn2c08.png')
+        eager = PngParser(file_name)
+        eager.parse()
+        streaming = PngParser(file_name)
+        streaming.parse(streaming=True)
+
+        for record in streaming.chunks['IDAT']:
+            self.assertEqual(tuple, type(record))
+        self.assertEqual(eager.chunks['IHDR'], streaming.chunks['IHDR'])
+        self.assertEqual(eager.chunks['IDAT'], list(streaming.iter_idat()))
+        self.assertEqual(eager.layout, streaming.layout)
+
+    def test_mapped_parse_exposes_idat_views(self):
+        file_name = os.path.join(self.suite, 'basn6a16.png')
+        eager = PngParser(file_name)
+        eager.parse()
+        mapped = PngParser(file_name)
+        mapped.parse(mapped=True)
+
+        try:
+            views = list(mapped.iter_idat())
+            for view in views:
+                self.assertEqual(memoryview, type(view))
+            self.assertEqual(eager.chunks['IDAT'],
+                             [bytes(view) for view in views])
+            self.assertEqual(eager.chunks['IHDR'], mapped.chunks['IHDR'])
+        finally:
+            mapped.close()
+        self.assertEqual([], mapped.chunks['IDAT'])
+
+    def test_mapped_parse_only_correct_png_files(self):
+        with self.assertRaises(AttributeError):
+            parser = PngParser(os.path.join(self.suite, 'xcrn0g04.png'))
+            parser.parse(mapped=True)
+
+    def test_truncated_file_is_incorrect(self):
+        directory = tempfile.mkdtemp()
+        try:
+            file_name = os.path.join(directory, 'truncated.png')
+            with open(os.path.join(self.suite, 'basn2c08.png'), 'rb') as file:
+                data = file.read()
+            with open(file_name, 'wb') as file:
+                file.write(data[:len(data) // 2])
+
+            parser = PngParser(file_name)
+            with self.assertRaises(AttributeError):
+                parser.parse(mapped=True)
+            self.assertIsNone(parser.mapping)
+            with self.assertRaises(AttributeError):
+                decode(file_name)
+        finally:
+            shutil.rmtree(directory)
+
+    def test_parse_with_crc_check(self):
+        parser = PngParser(os.path.join(self.suite, 'basn0g01.png'))
+        parser.parse(check_crc=True)
+        parser.close()
+        for name in ('xhdn0g08.png', 'xcsn0g01.png'):
+            with self.assertRaises(AttributeError):
+                parser = PngParser(os.path.join(self.suite, name))
+                parser.parse(check_crc=True)
+
+    def test_read_chunk_data_on_demand(self):
+        parser = PngParser(os.path.join(self.suite, 'ct1n0g04.png'))
+        for chunk_type, offset, length in parser.iter_chunks():
+            if chunk_type == 'IHDR':
+                header = parser.read_chunk_data(offset, length)
+                self.assertEqual(32, int_from_bytes(header[:4]))
+
+    def test_iter_scanlines_matches_full_decompress(self):
+        parser = PngParser(os.path.join(self.suite, 'basn2c08.png'))
+        parser.parse()
+        data = zlib.decompress(b''.join(parser.chunks['IDAT']))
+        scanline_len = 32 * 3 + 1
+
+        scanlines = list(iter_scanlines(parser.iter_idat(),
+                                        repeat(scanline_len, 32)))
+        self.assertEqual(32, len(scanlines))
+        self.assertEqual(data, b''.join(scanlines))
+
+    def test_iter_scanlines_yields_before_stream_end(self):
+        raw = bytes(range(256)) * 64
+        compressed = zlib.compress(raw)
+        pieces = [compressed[i:i + 10] for i in range(0, len(compressed), 10)]
+        consumed = []
+
+        def feed():
+            for piece in pieces:
+                consumed.append(piece)
+                yield piece
+
+        scanlines = iter_scanlines(feed(), repeat(256, 64))
+        self.assertEqual(raw[:256], next(scanlines))
+        self.assertLess(len(consumed), len(pieces))
+        self.assertEqual(raw[256:], b''.join(scanlines))
+
     def test_set_info_from_header(self):
         png = PngInfo(os.path.join(self.suite, 'basn0g01.png'))
         self.assertTrue(png.chunks['IHDR'] is not None)
@@ -40,6 +180,59 @@ class TestParser(unittest.TestCase):
         self.assertEqual(png.info['Filter method'], '0 (Adaptive)')
         self.assertEqual(png.info['Interlace method'], '0 (Noninterlaced)\n')
 
+    def test_info_error_is_not_cached(self):
+        png = PngInfo(os.path.join(self.suite, 'xd3n2c08.png'))
+        for _ in range(2):
+            with self.assertRaises(AttributeError):
+                png.info
+
+    def test_broken_zip_text_is_not_cached(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        file_name = os.path.join(directory, 'ztxt.png')
+        with open(os.path.join(self.suite, 'basn0g01.png'), 'rb') as file:
+            data = file.read()
+        chunk = b'zTXt' + b'Title\x00\x00not zlib'
+        chunk = len(chunk[4:]).to_bytes(4, 'big') + chunk + \
+            zlib.crc32(chunk).to_bytes(4, 'big')
+        with open(file_name, 'wb') as file:
+            file.write(data[:33] + chunk + data[33:])
+
+        png = PngInfo(file_name)
+        for _ in range(2):
+            with self.assertRaises(zlib.error):
+                png.info
+
+    def test_header_only_info(self):
+        png = PngInfo.header_only(os.path.join(self.suite, 'basi3p02.png'))
+        self.assertEqual(32, png.width)
+        self.assertEqual(32, png.height)
+        self.assertEqual(2, png.bit_depth)
+        self.assertEqual(3, png.color_type_index)
+        self.assertEqual(1, png.interlace_method)
+        self.assertEqual([], png.parser.layout)
+
+        self.assertEqual('3 (Palette)', png.info['Color type'])
+        self.assertTrue(png.chunks['PLTE'] is not None)
+
+    def test_header_only_reads_first_33_bytes(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        file_name = os.path.join(directory, 'head.png')
+        with open(os.path.join(self.suite, 'basn2c16.png'), 'rb') as file:
+            head = file.read(33)
+        with open(file_name, 'wb') as file:
+            file.write(head)
+
+        png = PngInfo.header_only(file_name)
+        self.assertEqual(16, png.bit_depth)
+        with self.assertRaises(AttributeError):
+            png.info
+
+    def test_header_only_checks_header(self):
+        with self.assertRaises(AttributeError):
+            PngInfo.header_only(os.path.join(self.suite, 'xcrn0g04.png'))
+
     def test_set_transparency_info(self):
         png = PngInfo(os.path.join(self.suite, 'tbbn2c16.png'))
         self.assertTrue(png.chunks['tRNS'] is not None)
@@ -135,5 +328,327 @@ class TestParser(unittest.TestCase):
         self.assertEqual(png.info['Last modification time'],
                          '2000-1-1 12:34:56\n')
 
+class TestUnfilter(unittest.TestCase):
+    suite = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'suite')
+
+    def check_against_legacy(self, scanlines, bpp):
+        unfilter = Unfilter(len(scanlines[0]) - 1, bpp)
+        prev_line = None
+        for scanline in scanlines:
+            expected = legacy_unfilter(scanline[0], prev_line,
+                                       scanline[1:], bpp)
+            self.assertEqual(expected, bytes(unfilter.unfilter(scanline)))
+            prev_line = expected
+
+    def test_each_filter_type(self):
+        for bpp in (1, 3, 4, 8):
+            for filter_type in range(5):
+                scanlines = [bytes([filter_type]) + os.urandom(bpp * 7)
+                             for _ in range(4)]
+                self.check_against_legacy(scanlines, bpp)
+
+    def test_mixed_filter_types(self):
+        scanlines = [bytes([i % 5]) + os.urandom(24) for i in range(12)]
+        self.check_against_legacy(scanlines, 3)
+
+    def test_png_suite_filtered_images(self):
+        for name, bpp in (('f00n2c08.png', 3), ('f01n2c08.png', 3),
+                          ('f02n2c08.png', 3), ('f03n2c08.png', 3),
+                          ('f04n2c08.png', 3), ('f04n0g08.png', 1)):
+            parser = PngParser(os.path.join(self.suite, name))
+            parser.parse()
+            scanlines = list(iter_scanlines(parser.iter_idat(),
+                                            repeat(32 * bpp + 1, 32)))
+            self.check_against_legacy(scanlines, bpp)
+
+    def test_incorrect_filter_type(self):
+        with self.assertRaises(AttributeError):
+            Unfilter(3, 3).unfilter(b'\x05\x01\x02\x03')
+
+
+class TestPixelConverter(unittest.TestCase):
+    def test_rgb_pixels(self):
+        converter = PixelConverter(2, 2, 8)
+        pixels = converter.to_argb32([[1, 2, 3, 250, 251, 252]])
+        self.assertEqual([[0xff010203, 0xfffafbfc]], pixels.tolist())
+
+    def test_rgba_pixels_from_16_bit_samples(self):
+        converter = PixelConverter(1, 6, 16)
+        pixels = converter.to_argb32([[0x12, 0xff, 0x34, 0xff,
+                                       0x56, 0x00, 0x78, 0x00]])
+        self.assertEqual([[0x78123456]], pixels.tolist())
+
+    def test_gray_and_gray_alpha_pixels(self):
+        gray = PixelConverter(2, 0, 8).to_argb32([[0, 200]])
+        self.assertEqual([[0xff000000, 0xffc8c8c8]], gray.tolist())
+        gray_alpha = PixelConverter(1, 4, 8).to_argb32([[0x40, 0x80]])
+        self.assertEqual([[0x80404040]], gray_alpha.tolist())
+
+    def test_palette_pixels_with_transparency(self):
+        converter = PixelConverter(3, 3, 8, b'\x01\x02\x03\x04\x05\x06',
+                                   b'\x10')
+        pixels = converter.to_argb32([[0, 1, 7]])
+        self.assertEqual([[0x10010203, 0xff040506, 0xff000000]],
+                         pixels.tolist())
+
+    def test_convert_into_buffer(self):
+        out = np.zeros((2, 2), np.uint32)
+        PixelConverter(2, 0, 8).to_argb32([[1, 2], [3, 4]], out)
+        self.assertEqual(0xff040404, out[1, 1])
+
+    def test_unpack_sub_byte_samples(self):
+        samples = PixelConverter(4, 0, 2).get_samples([[0b00011011]])
+        self.assertEqual([0, 1, 2, 3], samples[0, :, 0].tolist())
+        samples = PixelConverter(3, 0, 4).get_samples([[0xab, 0xc0]])
+        self.assertEqual([10, 11, 12], samples[0, :, 0].tolist())
+        samples = PixelConverter(10, 0, 1).get_samples([[0b10100000, 0x40]])
+        self.assertEqual([1, 0, 1, 0, 0, 0, 0, 0, 0, 1],
+                         samples[0, :, 0].tolist())
+
+    def test_sub_byte_gray_is_scaled(self):
+        pixels = PixelConverter(2, 0, 4).to_rgba([[0x0f]])
+        self.assertEqual([[0, 0, 0, 255], [255, 255, 255, 255]],
+                         pixels[0].tolist())
+        pixels = PixelConverter(4, 0, 2).to_rgba([[0b00011011]])
+        self.assertEqual([0, 85, 170, 255], pixels[0, :, 0].tolist())
+
+    def test_sub_byte_palette_lookup(self):
+        converter = PixelConverter(2, 3, 4, b'\x00\x00\x00\x0a\x0b\x0c')
+        pixels = converter.to_rgba([[0x10]])
+        self.assertEqual([[10, 11, 12, 255], [0, 0, 0, 255]],
+                         pixels[0].tolist())
+
+    def test_palette_image_requires_palette(self):
+        with self.assertRaises(AttributeError):
+            PixelConverter(2, 3, 8)
+
+
+class TestDecode(unittest.TestCase):
+    suite = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'suite')
+
+    def decode(self, name):
+        return decode(os.path.join(self.suite, name))
+
+    def test_decode_shape_and_type(self):
+        image = self.decode('basn2c08.png')
+        self.assertEqual((32, 32, 4), image.shape)
+        self.assertEqual(np.uint8, image.dtype)
+        self.assertTrue((image[:, :, 3] == 255).all())
+
+        image = self.decode('basn6a16.png')
+        self.assertEqual(np.uint16, image.dtype)
+
+    def test_decode_sub_byte_grayscale(self):
+        image = self.decode('basn0g01.png')
+        self.assertEqual([0, 255], np.unique(image[:, :, 0]).tolist())
+        image = self.decode('basn0g02.png')
+        self.assertEqual([0, 0, 0, 0, 85, 85, 85, 85],
+                         image[0, :8, 0].tolist())
+
+    def test_decode_palette(self):
+        image = self.decode('basn3p04.png')
+        self.assertEqual([255, 0, 0, 255], image[0, 0].tolist())
+        self.assertTrue((image[:, :, 3] == 255).all())
+
+    def test_decode_transparency(self):
+        for name in ('tbbn2c16.png', 'tbbn3p08.png', 'tbbn0g04.png'):
+            image = self.decode(name)
+            self.assertTrue((image[:, :, 3] == 0).any())
+            self.assertTrue((image[:, :, 3] != 0).any())
+
+    def test_decode_gray_matches_rgb(self):
+        gray = self.decode('basn0g08.png')
+        self.assertTrue((gray[:, :, 0] == gray[:, :, 1]).all())
+        self.assertTrue((gray[:, :, 0] == gray[:, :, 2]).all())
+
+    def test_decode_interlaced_images(self):
+        for name in ('basi0g01.png', 'basi0g16.png', 'basi2c08.png',
+                     'basi3p02.png', 'basi4a16.png', 'basi6a08.png',
+                     's01i3p01.png', 's07i3p02.png', 's39i3p04.png'):
+            interlaced = self.decode(name)
+            plain = self.decode(name[:3] + 'n' + name[4:])
+            self.assertTrue((interlaced == plain).all(), name)
+
+    def test_interlaced_preview_after_first_pass(self):
+        decoder = PngDecoder(os.path.join(self.suite, 'basi2c08.png'),
+                             preview=True)
+        passes = decoder.iter_decode()
+        self.assertEqual((0, 32), next(passes))
+        image = decoder.image
+        self.assertTrue((image[:8, :8] == image[0, 0]).all())
+        self.assertTrue((image[:, :, 3] == 255).all())
+        self.assertEqual(6, len(list(passes)))
+
+    def test_decode_only_correct_png_files(self):
+        with self.assertRaises(AttributeError):
+            self.decode('xcrn0g04.png')
+
+
+class TestScanner(unittest.TestCase):
+    suite = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'suite')
+
+    def test_scan_file(self):
+        row = scan_file(os.path.join(self.suite, 'ct1n0g04.png'))
+        self.assertEqual(32, row['Width'])
+        self.assertEqual(32, row['Height'])
+        self.assertEqual('0 (Grayscale)', row['Color type'])
+        self.assertEqual(['IHDR', 'gAMA', 'tEXt', 'IDAT', 'IEND'],
+                         row['Chunks'])
+        self.assertEqual('Title', row['Text keys'][0])
+        self.assertIsNone(row['Error'])
+
+    def test_scan_file_reports_errors(self):
+        row = scan_file(os.path.join(self.suite, 'xcrn0g04.png'))
+        self.assertEqual('Incorrect PNG signature', row['Error'])
+        row = scan_file(os.path.join(self.suite, 'png.txt'))
+        self.assertEqual('This is not .png file', row['Error'])
+
+    def test_scan_file_requires_iend(self):
+        directory = tempfile.mkdtemp()
+        try:
+            file_name = os.path.join(directory, 'no_iend.png')
+            with open(os.path.join(self.suite, 'ct1n0g04.png'), 'rb') as file:
+                data = file.read()
+            with open(file_name, 'wb') as file:
+                file.write(data[:-12])  # без чанка IEND
+
+            row = scan_file(file_name)
+            self.assertEqual('Incorrect IEND chunk', row['Error'])
+            self.assertEqual(32, row['Width'])
+        finally:
+            shutil.rmtree(directory)
+
+    def test_find_png_files_in_directories_and_globs(self):
+        files = list(find_png_files([self.suite]))
+        self.assertEqual(sorted(files), files)
+        self.assertNotIn(os.path.join(self.suite, 'png.txt'), files)
+        files = list(find_png_files([os.path.join(self.suite, 'ct*.png')]))
+        self.assertEqual(8, len(files))
+
+    def test_verify_file(self):
+        row = verify_file(os.path.join(self.suite, 'basn0g01.png'))
+        self.assertEqual([], row['Corrupted chunks'])
+        self.assertEqual(4, row['Chunks checked'])
+        self.assertEqual(164, row['Size'])
+        self.assertTrue(row['MB/s'] > 0)
+
+        row = verify_file(os.path.join(self.suite, 'xhdn0g08.png'))
+        self.assertEqual(['IHDR at 8'], row['Corrupted chunks'])
+
+    def test_verify_many_files(self):
+        pattern = os.path.join(self.suite, 'x*.png')
+        rows = list(verify([pattern], workers=2))
+        corrupted = [os.path.basename(row['File']) for row in rows
+                     if row['Corrupted chunks']]
+        self.assertEqual(['xcsn0g01.png', 'xhdn0g08.png'], corrupted)
+
+    def test_verify_reports_truncated_file(self):
+        directory = tempfile.mkdtemp()
+        try:
+            for name in ('basn0g01.png', 'basn2c08.png'):
+                shutil.copy(os.path.join(self.suite, name), directory)
+            with open(os.path.join(self.suite, 'basn0g02.png'), 'rb') as file:
+                data = file.read()
+            with open(os.path.join(directory, 'basn0g02.png'), 'wb') as file:
+                file.write(data[:60])
+
+            rows = list(verify([directory], workers=2))
+            self.assertEqual([None, 'Incorrect IDAT chunk', None],
+                             [row['Error'] for row in rows])
+            self.assertEqual(4, rows[2]['Chunks checked'])
+        finally:
+            shutil.rmtree(directory)
+
+    def test_verify_reports_file_cut_at_chunk_boundary(self):
+        directory = tempfile.mkdtemp()
+        self.addCleanup(shutil.rmtree, directory)
+        file_name = os.path.join(directory, 'cut.png')
+        with open(os.path.join(self.suite, 'basn0g01.png'), 'rb') as file:
+            data = file.read()
+
+        for cut, error in ((-12, 'Incorrect IEND chunk'),  # без IEND
+                           (33, 'Incorrect IDAT chunk'),  # только IHDR
+                           (-8, 'Incorrect chunk header')):
+            with open(file_name, 'wb') as file:
+                file.write(data[:cut])
+            row = verify_file(file_name)
+            self.assertEqual(error, row['Error'])
+            self.assertIsNone(row['Size'])
+
+    def test_scan_keeps_file_order(self):
+        pattern = os.path.join(self.suite, 'bas*.png')
+        rows = list(scan([pattern], workers=2, chunksize=3))
+        self.assertEqual(list(find_png_files([pattern])),
+                         [row['File'] for row in rows])
+
+
+class TestInfoCache(unittest.TestCase):
+    suite = os.path.join(os.path.dirname(os.path.abspath(__file__)), 'suite')
+
+    def setUp(self):
+        self.directory = tempfile.mkdtemp()
+        self.file_name = os.path.join(self.directory, 'image.png')
+        shutil.copy(os.path.join(self.suite, 'basn2c08.png'), self.file_name)
+        self.cache = InfoCache(os.path.join(self.directory, 'cache.sqlite'))
+
+    def tearDown(self):
+        self.cache.close()
+        shutil.rmtree(self.directory)
+
+    def test_get_info_round_trip(self):
+        self.assertIsNone(self.cache.get(self.file_name))
+        info = self.cache.get_info(self.file_name).info
+        cached = self.cache.get_info(self.file_name)
+        self.assertFalse(cached.is_parsed)
+        self.assertEqual(info, cached.info)
+        self.assertEqual(32, cached.width)
+
+    def test_changed_file_is_stale(self):
+        self.cache.get_info(self.file_name)
+        stat = os.stat(self.file_name)
+        os.utime(self.file_name, ns=(stat.st_atime_ns,
+                                     stat.st_mtime_ns + 10 ** 9))
+        self.assertIsNone(self.cache.get(self.file_name))
+
+        self.cache.get_info(self.file_name)
+        with open(self.file_name, 'ab') as file:
+            file.write(b'\x00')
+        self.assertIsNone(self.cache.get(self.file_name))
+
+    def test_scan_uses_cached_rows(self):
+        rows = list(scan([self.directory], workers=1, cache=self.cache))
+        self.assertEqual(rows, list(scan([self.directory], workers=1,
+                                         cache=self.cache)))
+        self.assertEqual(rows[0], self.cache.get(self.file_name, 'scan'))
+
+    def test_put_many_commits_once(self):
+        statements = []
+        self.cache.connection.set_trace_callback(statements.append)
+        shutil.copy(self.file_name, os.path.join(self.directory, 'b.png'))
+        list(scan([self.directory], workers=1, cache=self.cache))
+        self.assertEqual(1, statements.count('COMMIT'))
+        self.assertIsNotNone(self.cache.get(
+            os.path.join(self.directory, 'b.png'), 'scan'))
+
+    def test_image_cache_evicts_least_recent(self):
+        names = []
+        for name in 'abc':
+            names.append(os.path.join(self.directory, name + '.png'))
+            shutil.copy(self.file_name, names[-1])
+
+        images = ImageCache(budget=2 * 32 * 32 * 4)
+        pixels = np.zeros((32, 32), np.uint32)
+        images.put(names[0], pixels)
+        images.put(names[1], pixels.copy())
+        self.assertIs(pixels, images.get(names[0]))
+        images.put(names[2], pixels.copy())
+        self.assertIn(names[0], images)
+        self.assertNotIn(names[1], images)
+        self.assertEqual(images.budget, images.size)
+
+        images.put(names[0], np.zeros((64, 64), np.uint32))
+        self.assertIs(pixels, images.get(names[0]))
+
+
 if __name__ == '__main__':
     unittest.main()